@@ -0,0 +1,62 @@
+# app/acrud.py
+# Асинхронные обёртки над crud для async-обработчиков. Логика запросов одна и та же:
+# с AsyncSession функция crud выполняется через run_sync, с обычной Session — в пуле потоков.
+from starlette.concurrency import run_in_threadpool
+from . import crud, schemas
+from .passwords import hasher
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+except ImportError:  # без greenlet асинхронный режим недоступен
+    AsyncSession = None
+
+
+async def _call(db, fn, *args, **kwargs):
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+# Пользователи
+async def get_user_by_username(db, username: str):
+    return await _call(db, crud.get_user_by_username, username)
+
+async def create_user(db, user: schemas.UserCreate, is_admin: bool = False):
+    # bcrypt считаем в пуле хеширования до обращения к БД: run_sync выполняется в потоке event loop
+    hashed_password = await hasher.hash(user.password)
+    return await _call(db, crud.create_user, user, is_admin, hashed_password=hashed_password)
+
+
+# Книги
+async def get_book(db, book_id: int):
+    return await _call(db, crud.get_book, book_id)
+
+async def get_book_out(db, book_id: int):
+    return await _call(db, crud.get_book_out, book_id)
+
+async def get_books(db, **kwargs):
+    return await _call(db, crud.get_books, **kwargs)
+
+async def get_books_page(db, **kwargs):
+    return await _call(db, crud.get_books_page, **kwargs)
+
+async def search_books(db, q: str, skip: int = 0, limit: int = 10):
+    return await _call(db, crud.search_books, q, skip=skip, limit=limit)
+
+async def count_books(db):
+    return await _call(db, crud.count_books)
+
+async def get_catalog_version(db):
+    return await _call(db, crud.get_catalog_version)
+
+async def create_book(db, book: schemas.BookCreate):
+    return await _call(db, crud.create_book, book)
+
+async def update_book(db, book_id: int, book_update: schemas.BookUpdate):
+    return await _call(db, crud.update_book, book_id, book_update)
+
+async def delete_book(db, book_id: int):
+    return await _call(db, crud.delete_book, book_id)
+
+async def batch_books(db, batch: schemas.BookBatch):
+    return await _call(db, crud.batch_books, batch)
@@ -1,9 +1,12 @@
 # app/auth.py
+import hashlib
+import hmac
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from . import crud, schemas, database
+from . import acrud, schemas, database
+from .cache import token_cache, user_cache
 from .config import settings
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
@@ -15,10 +18,39 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-def get_current_user(request: Request, db: Session = Depends(database.get_db)):
+def _token_digest(token: str) -> bytes:
+    # HMAC с текущим SECRET_KEY и алгоритмом: после смены ключа старые записи кеша просто не находятся
+    key = f"{settings.ALGORITHM}:{settings.SECRET_KEY}".encode("utf-8")
+    return hmac.new(key, token.encode("utf-8"), hashlib.sha256).digest()
+
+def verify_token(token: str):
+    """
+    Возвращает username из действительного токена или None. Проверенные токены
+    кешируются до их exp, поэтому повторный запрос с тем же токеном не проверяет подпись.
+    """
+    digest = _token_digest(token)
+    username = token_cache.get(digest)
+    if username is not None:
+        return username
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        username = schemas.TokenData(username=payload.get("sub")).username
+    except (JWTError, ValueError):
+        return None
+    if username is None:
+        return None
+    exp = payload.get("exp")
+    # Токены без exp не кешируем: им не на что опереться при вытеснении
+    if isinstance(exp, (int, float)):
+        ttl = exp - time.time()
+        if ttl > 0:
+            token_cache.set(digest, username, ttl=ttl)
+    return username
+
+async def get_current_user(request: Request, db = Depends(database.get_session)):
     """
-    Извлекает токен из заголовка или cookies и возвращает объект пользователя,
-    либо None, если токен отсутствует или недействительный.
+    Извлекает токен из заголовка или cookies и возвращает пользователя (снимок
+    schemas.UserOut из кеша или БД), либо None, если токен отсутствует или недействительный.
     """
     token = request.headers.get("Authorization")
     if token and token.startswith("Bearer "):
@@ -27,13 +59,14 @@ def get_current_user(request: Request, db: Session = Depends(database.get_db)):
         token = request.cookies.get("access_token")
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+    username = verify_token(token)
+    if username is None:
         return None
-    user = crud.get_user_by_username(db, username=token_data.username)
+    user = user_cache.get(username)
+    if user is None:
+        db_user = await acrud.get_user_by_username(db, username=username)
+        if db_user is None:
+            return None
+        user = schemas.UserOut.from_orm(db_user)
+        user_cache.set(username, user)
     return user
@@ -0,0 +1,179 @@
+# app/cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, Optional
+from .config import settings
+
+# Все именованные кеши приложения — для статистики попаданий/промахов
+CACHES: Dict[str, "TTLCache"] = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кеш с ограничением по размеру и времени жизни записей.
+    Время жизни можно задать и для отдельной записи (set(..., ttl=...)).
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class KeyValueCache:
+    """
+    Кеш во внешнем key-value хранилище (Redis или совместимый клиент с get/set(ex=)/
+    delete/scan_iter): общий для всех воркеров. Значения хранятся в JSON, поэтому
+    класть можно только JSON-совместимые данные. Размер и вытеснение задаёт само хранилище.
+    """
+
+    def __init__(self, name: str, client, ttl: float, prefix: Optional[str] = None):
+        self.name = name
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix if prefix is not None else f"cache:{name}:"
+        self.hits = 0
+        self.misses = 0
+        CACHES[name] = self
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self._key(key), json.dumps(value, separators=(",", ":")), ex=max(int(ttl), 1))
+
+    def delete(self, key: Hashable):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.client).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class LocalKeyValueStore:
+    """Замена внешнего хранилища в процессе (тесты, разработка): то же подмножество API, что у redis.Redis."""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key: str, value: str, ex: Optional[int] = None):
+        expires_at = time.monotonic() + ex if ex else float("inf")
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def scan_iter(self, match: str = "*") -> Iterator[str]:
+        prefix = match.rstrip("*")
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+        return iter(keys)
+
+
+def make_cache(name: str, maxsize: int, ttl: float, backend: str = "memory", url: Optional[str] = None):
+    """Кеш с выбранным бэкендом: memory — TTLCache в процессе, redis — KeyValueCache."""
+    if backend == "memory":
+        return TTLCache(name, maxsize=maxsize, ttl=ttl)
+    if backend == "redis":
+        import redis  # необязательная зависимость, нужна только для этого бэкенда
+
+        return KeyValueCache(name, redis.Redis.from_url(url or "redis://localhost:6379/0", decode_responses=True), ttl=ttl)
+    raise ValueError(f"Unknown cache backend {backend!r}, expected 'memory' or 'redis'")
+
+
+# Снимки пользователей (schemas.UserOut) по username для auth.get_current_user
+user_cache = TTLCache("users", maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+# Уже проверенные JWT: HMAC-дайджест токена -> username, запись живёт до exp токена
+token_cache = TTLCache("tokens", maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# Сериализованные BookOut (dict) по id книги для GET /api/books/{id}
+book_cache = make_cache(
+    "books", maxsize=settings.BOOK_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL,
+    backend=settings.BOOK_CACHE_BACKEND, url=settings.BOOK_CACHE_URL,
+)
@@ -1,12 +1,99 @@
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
+# Профили движка БД: пул, PRAGMA для SQLite, кеш скомпилированных запросов и логирование SQL.
+# Отдельные параметры можно переопределить переменными DB_* поверх выбранного профиля.
+ENGINE_PROFILES = {
+    "production": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "query_cache_size": 1200,
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -64000,  # ~64 МБ страничного кеша
+            "mmap_size": 268435456,  # 256 МБ
+            "busy_timeout": 5000,
+        },
+        "echo": False,
+        "echo_sample_rate": 0.01,
+        "query_count_header": False,
+    },
+    "test": {
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "query_cache_size": 500,
+        "sqlite_pragmas": {
+            "journal_mode": "MEMORY",
+            "synchronous": "OFF",
+            "cache_size": -16000,
+            "busy_timeout": 5000,
+        },
+        "echo": False,
+        "echo_sample_rate": 1.0,
+        "query_count_header": True,  # X-Query-Count в ответах, чтобы тесты проверяли число запросов
+    },
+}
+
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./test.db"
+    DB_ASYNC: bool = False  # обработчики работают через AsyncSession вместо синхронной Session
+    ASYNC_DATABASE_URL: str = ""  # по умолчанию выводится из DATABASE_URL (sqlite+aiosqlite, postgresql+asyncpg)
+    ENGINE_PROFILE: str = "production"  # ключ из ENGINE_PROFILES
+    READ_REPLICA_URLS: List[str] = []  # реплики для read-only обработчиков, JSON-список в переменной окружения
+    READ_YOUR_WRITES_SECONDS: int = 5  # сколько после записи клиент читает с primary
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_RECYCLE: Optional[int] = None
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None
+    DB_ECHO: Optional[bool] = None  # логирование SQL включается явно
+    DB_ECHO_SAMPLE_RATE: Optional[float] = None  # доля логируемых запросов, 0..1
+    DB_QUERY_COUNT_HEADER: Optional[bool] = None  # отдавать X-Query-Count (по умолчанию только в профиле test)
     SECRET_KEY: str = "your_secret_key_here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_HASH_WORKERS: int = 4  # потоков bcrypt; логины не занимают пул потоков Starlette
+    PASSWORD_HASH_MAX_QUEUE: int = 64  # сверх этого ожидающих операций логин получает 503
+    USER_CACHE_SIZE: int = 1024  # пользователей в кеше get_current_user
+    USER_CACHE_TTL: int = 60  # секунд, сколько снимок пользователя считается свежим
+    TOKEN_CACHE_SIZE: int = 4096  # уже проверенных JWT; запись живёт до exp токена
+    BOOK_CACHE_SIZE: int = 2048  # книг (BookOut) в кеше GET /api/books/{id}
+    BOOK_CACHE_TTL: int = 300  # секунд; ограничивает устаревание при чтении с реплик
+    BOOK_CACHE_BACKEND: str = "memory"  # memory — в процессе, redis — общий для всех воркеров
+    BOOK_CACHE_URL: Optional[str] = None  # адрес Redis для BOOK_CACHE_BACKEND=redis
+    METRICS_ENABLED: bool = True  # /metrics в формате Prometheus и замеры по маршрутам
+    SLOW_QUERY_MS: float = 200  # запросы дольше этого попадают в журнал медленных запросов; 0 — выключено
+    SLOW_QUERY_LOG_SIZE: int = 200  # записей в кольцевом буфере журнала (/admin/slow-queries)
+    TEMPLATE_CACHE_DIR: Optional[str] = None  # байткод шаблонов Jinja; по умолчанию во временном каталоге
+    BOOK_BATCH_MAX_ITEMS: int = 1000  # операций в одном запросе /api/books/batch
+    IMPORT_CHUNK_SIZE: int = 1000  # книг на одну транзакцию при массовом импорте
+    IMPORT_WORKERS: int = 2  # потоков фонового импорта
+    IMPORT_LEASE_SECONDS: int = 300  # задачу без продления аренды дольше этого забирает другой воркер; больше времени одной пачки
+    IMPORT_SPOOL_DIR: Optional[str] = None  # куда копируются загрузки до обработки; по умолчанию во временном каталоге
+    EXPORT_CHUNK_SIZE: int = 1000  # книг на один запрос при потоковом экспорте
 
     class Config:
         env_file = ".env"
 
+    def engine_profile(self) -> dict:
+        """Параметры движка: профиль ENGINE_PROFILE с применёнными переопределениями DB_*."""
+        if self.ENGINE_PROFILE not in ENGINE_PROFILES:
+            raise ValueError(f"Unknown ENGINE_PROFILE {self.ENGINE_PROFILE!r}, expected one of {set(ENGINE_PROFILES)}")
+        profile = dict(ENGINE_PROFILES[self.ENGINE_PROFILE])
+        overrides = {
+            "pool_size": self.DB_POOL_SIZE,
+            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "query_cache_size": self.DB_STATEMENT_CACHE_SIZE,
+            "echo": self.DB_ECHO,
+            "echo_sample_rate": self.DB_ECHO_SAMPLE_RATE,
+            "query_count_header": self.DB_QUERY_COUNT_HEADER,
+        }
+        profile.update({key: value for key, value in overrides.items() if value is not None})
+        return profile
+
 settings = Settings()
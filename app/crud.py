@@ -1,28 +1,108 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from . import models, schemas
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import base64
+import json
+import time
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, desc, event, func, insert, inspect, literal, or_, select, true, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import database, models, schemas, search, serializers
+from .cache import book_cache, user_cache
+from .config import settings
+from .passwords import hasher
 
 # Пользователи
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, user: schemas.UserCreate, is_admin: bool = False):
-    hashed_password = pwd_context.hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, is_admin: bool = False, hashed_password: str = None):
+    # Хеш можно посчитать заранее, вне транзакции (так делает acrud.create_user)
+    hashed_password = hashed_password or hasher.hash_sync(user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password, is_admin=is_admin)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.delete(db_user.username)
     return db_user
 
 # Книги
+def _books_query(db: Session):
+    # Авторы подгружаются одним дополнительным SELECT ... IN на всю выборку, без N+1
+    return db.query(models.Book).options(selectinload(models.Book.authors))
+
 def get_book(db: Session, book_id: int):
-    return db.query(models.Book).filter(models.Book.id == book_id).first()
+    return _books_query(db).filter(models.Book.id == book_id).first()
+
+def get_book_out(db: Session, book_id: int) -> Optional[dict]:
+    """
+    Read-through: сериализованный BookOut из book_cache, при промахе — из БД с записью в кеш.
+    Кеш заполняется только с primary: отстающая реплика вернула бы в кеш версию,
+    которую только что сбросил коммит, и её получили бы и клиенты с read-your-writes.
+    """
+    payload = book_cache.get(book_id)
+    if payload is None:
+        db_book = get_book(db, book_id)
+        if db_book is None:
+            return None
+        payload = serializers.book_out(db_book)
+        if database.is_primary(db):
+            book_cache.set(book_id, payload)
+    return payload
+
+# Инвалидация book_cache: в after_flush собираем книги, чьё представление BookOut изменилось
+# (правка, удаление, смена авторов, переименование автора), и сбрасываем их после коммита
+_STALE_BOOKS = "stale_book_ids"
+
+@event.listens_for(Session, "after_flush")
+def _collect_stale_books(session: Session, flush_context):
+    stale = set()
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, models.Book):
+            stale.add(obj.id)
+        elif isinstance(obj, models.Author) and inspect(obj).attrs.name.history.has_changes():
+            stale.update(book.id for book in obj.books)
+    if stale:
+        session.info.setdefault(_STALE_BOOKS, set()).update(stale)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stale_books(session: Session):
+    for book_id in session.info.pop(_STALE_BOOKS, ()):
+        book_cache.delete(book_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_stale_books(session: Session):
+    session.info.pop(_STALE_BOOKS, None)
 
-def get_books(db: Session, skip: int = 0, limit: int = 10, sort_by: str = None, order: str = "asc"):
-    query = db.query(models.Book)
+def _like_pattern(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+# Верхняя граница диапазона для префикса: максимальная кодовая точка Unicode
+_PREFIX_UPPER_BOUND = "\U0010ffff"
+
+def _filter_books(query, title: str = None, author: str = None, genre: str = None,
+                  year_from: int = None, year_to: int = None):
+    if title:
+        # Регистронезависимый префикс как диапазон по lower(title): обслуживается индексом ix_books_title_lower
+        prefix = func.lower(title)
+        lowered = func.lower(models.Book.title)
+        query = query.filter(lowered >= prefix, lowered < prefix + _PREFIX_UPPER_BOUND)
+    if author:
+        # EXISTS по book_author -> authors: книга не дублируется при нескольких совпавших авторах
+        query = query.filter(models.Book.authors.any(models.Author.name.ilike(_like_pattern(author), escape="\\")))
+    if genre:
+        query = query.filter(models.Book.genre == genre)
+    if year_from is not None:
+        query = query.filter(models.Book.published_year >= year_from)
+    if year_to is not None:
+        query = query.filter(models.Book.published_year <= year_to)
+    return query
+
+def get_books(db: Session, skip: int = 0, limit: int = 10, sort_by: str = None, order: str = "asc",
+              title: str = None, author: str = None, genre: str = None,
+              year_from: int = None, year_to: int = None):
+    query = _filter_books(_books_query(db), title, author, genre, year_from, year_to)
     if sort_by:
         # Поддерживаем сортировку по title и published_year
         if sort_by == "title":
@@ -38,34 +118,206 @@ def get_books(db: Session, skip: int = 0, limit: int = 10, sort_by: str = None,
             query = query.order_by(sort_column)
     return query.offset(skip).limit(limit).all()
 
+def search_books(db: Session, q: str, skip: int = 0, limit: int = 10) -> List[models.Book]:
+    """Полнотекстовый поиск по названию и авторам, результаты отсортированы по релевантности."""
+    if not q.strip():
+        return []
+    ids = search.search_book_ids(db, q, skip=skip, limit=limit)
+    if ids is None:
+        # Нет полнотекстового индекса — подстрока в названии или имени автора
+        pattern = _like_pattern(q.strip())
+        return (
+            _books_query(db)
+            .filter(or_(models.Book.title.ilike(pattern, escape="\\"),
+                        models.Book.authors.any(models.Author.name.ilike(pattern, escape="\\"))))
+            .order_by(models.Book.id)
+            .offset(skip).limit(limit).all()
+        )
+    books = {book.id: book for book in _books_query(db).filter(models.Book.id.in_(ids))}
+    return [books[book_id] for book_id in ids if book_id in books]
+
+# Keyset-пагинация: курсор хранит активную сортировку и ключ (значение колонки, id) граничной книги
+SORT_COLUMNS = {"title": models.Book.title, "published_year": models.Book.published_year}
+# Тип значения колонки сортировки в ключе курсора
+SORT_KEY_TYPES = {"title": str, "published_year": int}
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _is_key_value(value) -> bool:
+    # bool — подкласс int, но в ключе курсора его быть не может
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+def decode_cursor(token: str) -> dict:
+    """
+    Разбирает непрозрачный курсор и проверяет типы значений; бросает ValueError,
+    если он повреждён. Возвращает {s, o, k, d, p} с подставленными умолчаниями.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(data, dict):
+            raise ValueError
+        sort_by, order, key, page = data.get("s"), data.get("o", "asc"), data["k"], data.get("p", 1)
+        if data["d"] not in ("next", "prev") or order not in ("asc", "desc"):
+            raise ValueError
+        if sort_by is not None and sort_by not in SORT_COLUMNS:
+            raise ValueError
+        if not isinstance(key, list) or len(key) != (2 if sort_by else 1) or not all(map(_is_key_value, key)):
+            raise ValueError
+        # Последний элемент ключа — id книги, первый (при сортировке) — значение колонки
+        if not isinstance(key[-1], int) or (sort_by and not isinstance(key[0], SORT_KEY_TYPES[sort_by])):
+            raise ValueError
+        if not isinstance(page, int) or isinstance(page, bool) or page < 1:
+            raise ValueError
+        return {"s": sort_by, "o": order, "k": key, "d": data["d"], "p": page}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _cursor_key(book: models.Book, sort_by: Optional[str]) -> list:
+    return [getattr(book, sort_by), book.id] if sort_by else [book.id]
+
+def get_books_page(db: Session, cursor: str = None, limit: int = 10, sort_by: str = None, order: str = "asc",
+                   title: str = None, author: str = None, genre: str = None,
+                   year_from: int = None, year_to: int = None) -> Tuple[List[models.Book], Optional[str], Optional[str]]:
+    """
+    Страница книг по курсору вместо OFFSET: WHERE (колонка, id) > ключ ORDER BY колонка, id.
+    Стоимость не зависит от глубины страницы. Возвращает (книги, курсор вперёд, курсор назад).
+    Если передан курсор, сортировка берётся из него.
+    """
+    page = 1
+    key, direction = None, "next"
+    if cursor:
+        data = decode_cursor(cursor)
+        sort_by, order, key, direction, page = data["s"], data["o"], data["k"], data["d"], data["p"]
+    if sort_by not in SORT_COLUMNS:
+        sort_by = None
+    if order != "desc":
+        order = "asc"
+
+    columns = [SORT_COLUMNS[sort_by], models.Book.id] if sort_by else [models.Book.id]
+    # Для «назад» идём в обратном порядке от первой книги страницы, потом разворачиваем
+    descending = (order == "desc") != (direction == "prev")
+    query = _filter_books(_books_query(db), title, author, genre, year_from, year_to)
+    if key is not None:
+        if sort_by:
+            column, value, last_id = columns[0], key[0], key[1]
+            if descending:
+                query = query.filter(or_(column < value, and_(column == value, models.Book.id < last_id)))
+            else:
+                query = query.filter(or_(column > value, and_(column == value, models.Book.id > last_id)))
+        else:
+            query = query.filter(models.Book.id < key[0] if descending else models.Book.id > key[0])
+    query = query.order_by(*[desc(c) if descending else c for c in columns])
+    books = query.limit(limit + 1).all()
+    has_more = len(books) > limit
+    books = books[:limit]
+    if direction == "prev":
+        books.reverse()
+
+    def make_cursor(book, d, p):
+        return encode_cursor({"s": sort_by, "o": order, "k": _cursor_key(book, sort_by), "d": d, "p": p})
+
+    has_next = has_more if direction == "next" else key is not None
+    has_prev = key is not None if direction == "next" else has_more
+    next_cursor = make_cursor(books[-1], "next", page + 1) if books and has_next else None
+    prev_cursor = make_cursor(books[0], "prev", page - 1) if books and has_prev else None
+    return books, next_cursor, prev_cursor
+
+def iter_books(db: Session, chunk_size: int = None):
+    """
+    Обходит все книги по возрастанию id пачками (keyset по id, без OFFSET),
+    подгружая авторов одним запросом на пачку. Память не зависит от размера таблицы.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    last_id = 0
+    while True:
+        chunk = (
+            _books_query(db)
+            .filter(models.Book.id > last_id)
+            .order_by(models.Book.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1].id
+
+# Счётчики каталога
+BOOK_COUNT = "book_count"
+# Версия каталога: растёт при каждой записи книг, из неё строятся ETag
+CATALOG_VERSION = "catalog_version"
+
+def _bump_counter(db: Session, name: str, delta: int = 1):
+    """Сдвигает счётчик в текущей транзакции; коммитит вызывающий код вместе с самой записью."""
+    db.execute(
+        update(models.CatalogCounter)
+        .where(models.CatalogCounter.name == name)
+        .values(value=models.CatalogCounter.value + delta)
+    )
+
+# INSERT с поддержкой ON CONFLICT для бэкендов, где он есть
+_UPSERT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+def _seed_counter(db: Session, name: str, value):
+    # WHERE true обязателен для SQLite: без него ON CONFLICT после SELECT разбирается как JOIN ... ON
+    stmt = select(literal(name), value).where(true())
+    columns = [models.CatalogCounter.name, models.CatalogCounter.value]
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        seed = dialect_insert(models.CatalogCounter).from_select(columns, stmt).on_conflict_do_nothing()
+    else:
+        exists = select(models.CatalogCounter.name).where(models.CatalogCounter.name == name).exists()
+        seed = insert(models.CatalogCounter).from_select(columns, stmt.where(~exists))
+    db.execute(seed)
+
+def seed_counters(db: Session):
+    """
+    Создаёт строки-счётчики операторами INSERT ... SELECT ... ON CONFLICT DO NOTHING:
+    гонка нескольких процессов на старте безопасна. Вызывать только на primary.
+    """
+    _seed_counter(db, BOOK_COUNT, func.count(models.Book.id))
+    _seed_counter(db, CATALOG_VERSION, literal(0))
+    db.commit()
+
+def get_catalog_version(db: Session) -> int:
+    """Текущая версия каталога (поиск по PK); 0, если счётчик ещё не создан."""
+    value = db.execute(
+        select(models.CatalogCounter.value).where(models.CatalogCounter.name == CATALOG_VERSION)
+    ).scalar()
+    return value or 0
+
 def count_books(db: Session):
+    """
+    Число книг из строки-счётчика (поиск по PK вместо count(*)). Только чтение: если
+    строки нет (seed_counters ещё не выполнен), возвращает обычный count(*).
+    """
+    value = db.execute(
+        select(models.CatalogCounter.value).where(models.CatalogCounter.name == BOOK_COUNT)
+    ).scalar()
+    if value is not None:
+        return value
     return db.query(models.Book).count()
 
 def create_book(db: Session, book: schemas.BookCreate):
-    authors_instances = []
-    for author_name in book.authors:
-        author = db.query(models.Author).filter(models.Author.name == author_name).first()
-        if not author:
-            author = models.Author(name=author_name)
-            db.add(author)
-            db.commit()
-            db.refresh(author)
-        authors_instances.append(author)
+    authors = _authors_by_name(db, book.authors)
     db_book = models.Book(
         title=book.title,
         genre=book.genre,
         published_year=book.published_year,
-        authors=authors_instances
+        authors=[authors[name] for name in dict.fromkeys(book.authors)]
     )
     db.add(db_book)
+    _bump_counter(db, BOOK_COUNT, 1)
+    _bump_counter(db, CATALOG_VERSION)
+    db.flush()
+    search.index_books(db, [db_book.id])
     db.commit()
     db.refresh(db_book)
     return db_book
 
-def update_book(db: Session, book_id: int, book_update: schemas.BookUpdate):
-    db_book = get_book(db, book_id)
-    if not db_book:
-        return None
+def _apply_book_update(db_book: models.Book, book_update: schemas.BookUpdate, authors: Dict[str, models.Author]):
     if book_update.title is not None:
         db_book.title = book_update.title
     if book_update.genre is not None:
@@ -73,16 +325,16 @@ def update_book(db: Session, book_id: int, book_update: schemas.BookUpdate):
     if book_update.published_year is not None:
         db_book.published_year = book_update.published_year
     if book_update.authors is not None:
-        authors_instances = []
-        for author_name in book_update.authors:
-            author = db.query(models.Author).filter(models.Author.name == author_name).first()
-            if not author:
-                author = models.Author(name=author_name)
-                db.add(author)
-                db.commit()
-                db.refresh(author)
-            authors_instances.append(author)
-        db_book.authors = authors_instances
+        db_book.authors = [authors[name] for name in dict.fromkeys(book_update.authors)]
+
+def update_book(db: Session, book_id: int, book_update: schemas.BookUpdate):
+    db_book = get_book(db, book_id)
+    if not db_book:
+        return None
+    _apply_book_update(db_book, book_update, _authors_by_name(db, book_update.authors or ()))
+    _bump_counter(db, CATALOG_VERSION)
+    db.flush()
+    search.index_books(db, [db_book.id])
     db.commit()
     db.refresh(db_book)
     return db_book
@@ -91,5 +343,185 @@ def delete_book(db: Session, book_id: int):
     db_book = get_book(db, book_id)
     if db_book:
         db.delete(db_book)
+        _bump_counter(db, BOOK_COUNT, -1)
+        _bump_counter(db, CATALOG_VERSION)
+        search.remove_books(db, [book_id])
         db.commit()
     return db_book
+
+# Массовый импорт
+# Размер пачки для IN-запросов по авторам (держимся ниже лимита параметров SQLite)
+AUTHOR_LOOKUP_BATCH = 500
+# То же для выборки книг по id в пакетных операциях
+BOOK_LOOKUP_BATCH = 500
+
+def _insert_missing_authors(db: Session, names: List[str]):
+    """
+    Вставляет авторов одним multi-row INSERT, пропуская уже существующие имена
+    (ON CONFLICT DO NOTHING / INSERT IGNORE): параллельный писатель, успевший
+    вставить того же автора, не приводит к ошибке уникальности authors.name.
+    """
+    rows = [{"name": name} for name in names]
+    dialect = db.get_bind().dialect.name
+    dialect_insert = _UPSERT_INSERTS.get(dialect)
+    if dialect_insert is not None:
+        stmt = dialect_insert(models.Author).on_conflict_do_nothing(index_elements=["name"])
+    elif dialect in ("mysql", "mariadb"):
+        stmt = insert(models.Author).prefix_with("IGNORE")
+    else:
+        stmt = insert(models.Author)
+    db.execute(stmt, rows)
+
+def _select_author_ids(db: Session, names: List[str], known: Dict[str, int]):
+    for i in range(0, len(names), AUTHOR_LOOKUP_BATCH):
+        batch = names[i:i + AUTHOR_LOOKUP_BATCH]
+        rows = db.execute(
+            select(models.Author.name, models.Author.id).where(models.Author.name.in_(batch))
+        )
+        known.update((name, author_id) for name, author_id in rows)
+
+def _resolve_author_ids(db: Session, names: Iterable[str], known: Dict[str, int]) -> Dict[str, int]:
+    """
+    Дополняет словарь known (имя -> id) недостающими авторами: существующие
+    выбираются одним IN-запросом на пачку имён, отсутствующие вставляются
+    одним upsert и перечитываются. Коммит остаётся за вызывающим кодом.
+    """
+    missing = list(dict.fromkeys(name for name in names if name not in known))
+    _select_author_ids(db, missing, known)
+    new_names = [name for name in missing if name not in known]
+    if new_names:
+        _insert_missing_authors(db, new_names)
+        _select_author_ids(db, new_names, known)
+    return known
+
+def _authors_by_name(db: Session, names: Iterable[str]) -> Dict[str, models.Author]:
+    """
+    Объекты Author по именам для ORM-связей: id разрешаются через _resolve_author_ids
+    (с upsert отсутствующих), затем авторы загружаются одним IN-запросом по id на пачку.
+    """
+    author_ids = _resolve_author_ids(db, names, {})
+    ids = list(author_ids.values())
+    by_id: Dict[int, models.Author] = {}
+    for i in range(0, len(ids), AUTHOR_LOOKUP_BATCH):
+        by_id.update((a.id, a) for a in db.query(models.Author).filter(models.Author.id.in_(ids[i:i + AUTHOR_LOOKUP_BATCH])))
+    return {name: by_id[author_id] for name, author_id in author_ids.items()}
+
+def _insert_returning_ids(db: Session, table, rows: List[dict]) -> List[int]:
+    """Вставляет строки одним executemany и возвращает их id в порядке вставки."""
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return list(db.execute(stmt, rows).scalars())
+    # Бэкенды без RETURNING (например, MySQL): по одному INSERT, но в той же транзакции
+    return [db.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows]
+
+def bulk_create_books(db: Session, books: Iterable[schemas.BookCreate], chunk_size: int = None,
+                      author_ids: Dict[str, int] = None) -> schemas.ImportStats:
+    """
+    Импортирует книги (BookCreate или importer.ImportedBook с теми же полями)
+    пачками по chunk_size: на каждую пачку один INSERT книг,
+    один INSERT связей book_author и один коммит. Авторы разрешаются один раз
+    на весь импорт и кешируются между пачками (и между вызовами, если передан author_ids).
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    author_ids = {} if author_ids is None else author_ids
+    imported = 0
+    started = time.perf_counter()
+    books = iter(books)
+    try:
+        while True:
+            chunk = list(islice(books, chunk_size))
+            if not chunk:
+                break
+            _resolve_author_ids(db, (name for book in chunk for name in book.authors), author_ids)
+            book_rows = [
+                {"title": b.title, "genre": b.genre, "published_year": b.published_year}
+                for b in chunk
+            ]
+            book_ids = _insert_returning_ids(db, models.Book.__table__, book_rows)
+            links = [
+                {"book_id": book_id, "author_id": author_ids[name]}
+                for book_id, book in zip(book_ids, chunk)
+                for name in dict.fromkeys(book.authors)
+            ]
+            if links:
+                db.execute(insert(models.book_author), links)
+            _bump_counter(db, BOOK_COUNT, len(chunk))
+            _bump_counter(db, CATALOG_VERSION)
+            search.index_books(db, book_ids)
+            db.commit()
+            imported += len(chunk)
+    except Exception:
+        db.rollback()
+        raise
+    elapsed = time.perf_counter() - started
+    return schemas.ImportStats(
+        imported=imported,
+        seconds=round(elapsed, 3),
+        rows_per_second=round(imported / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+
+# Пакетные операции
+def batch_books(db: Session, batch: schemas.BookBatch) -> List[schemas.BookBatchItemResult]:
+    """
+    Создаёт, изменяет и удаляет книги одной транзакцией (в этом порядке). Авторы всего
+    пакета разрешаются одним набором IN-запросов, изменяемые и удаляемые книги
+    загружаются одним запросом. Несуществующие id дают результат 404, остальное применяется.
+    """
+    names = [name for book in batch.create for name in book.authors]
+    names += [name for book in batch.update if book.authors for name in book.authors]
+    authors = _authors_by_name(db, names)
+    ids = list({book.id for book in batch.update} | set(batch.delete))
+    existing = {}
+    for i in range(0, len(ids), BOOK_LOOKUP_BATCH):
+        existing.update((b.id, b) for b in _books_query(db).filter(models.Book.id.in_(ids[i:i + BOOK_LOOKUP_BATCH])))
+
+    try:
+        created = [
+            models.Book(title=book.title, genre=book.genre, published_year=book.published_year,
+                        authors=[authors[name] for name in dict.fromkeys(book.authors)])
+            for book in batch.create
+        ]
+        db.add_all(created)
+        updated = []
+        for book_update in batch.update:
+            db_book = existing.get(book_update.id)
+            if db_book is not None:
+                _apply_book_update(db_book, book_update, authors)
+            updated.append((book_update.id, db_book))
+        deleted, removed = [], set()
+        for book_id in batch.delete:
+            db_book = existing.get(book_id) if book_id not in removed else None
+            if db_book is not None:
+                db.delete(db_book)
+                removed.add(book_id)
+            deleted.append((book_id, db_book is not None))
+        db.flush()
+        if created or removed or any(db_book is not None for _, db_book in updated):
+            _bump_counter(db, BOOK_COUNT, len(created) - len(removed))
+            _bump_counter(db, CATALOG_VERSION)
+            changed = created + [b for book_id, b in updated if b is not None and book_id not in removed]
+            search.index_books(db, dict.fromkeys(b.id for b in changed))
+            search.remove_books(db, removed)
+
+        # Сериализуем до коммита: после него объекты истекают и потребовали бы перечитывания
+        results = [
+            schemas.BookBatchItemResult(op="create", id=b.id, status=201, book=schemas.BookOut.from_orm(b))
+            for b in created
+        ]
+        for book_id, db_book in updated:
+            if db_book is None:
+                results.append(schemas.BookBatchItemResult(op="update", id=book_id, status=404, detail="Book not found"))
+            else:
+                # Книга, удалённая этим же пакетом, возвращается без тела
+                book_out = schemas.BookOut.from_orm(db_book) if book_id not in removed else None
+                results.append(schemas.BookBatchItemResult(op="update", id=book_id, status=200, book=book_out))
+        for book_id, found in deleted:
+            if found:
+                results.append(schemas.BookBatchItemResult(op="delete", id=book_id, status=200))
+            else:
+                results.append(schemas.BookBatchItemResult(op="delete", id=book_id, status=404, detail="Book not found"))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
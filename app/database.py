@@ -1,13 +1,273 @@
-from sqlalchemy import create_engine
+import logging
+import logging.handlers
+import queue
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL, echo=True)
+sql_logger = logging.getLogger("app.sql")
+
+# Вызывается с (пул, секунды ожидания) после каждой выдачи соединения из QueuePool; ставит app.metrics
+pool_wait_observer: Optional[Callable] = None
+# Вызывается с (conn, cursor, statement, parameters, executemany, секунды) после каждого запроса; ставит app.slowlog
+query_observer: Optional[Callable] = None
+
+_timed_pool_classes: Dict[type, type] = {}
+
+def timed_pool_class(base: type) -> type:
+    """Подкласс QueuePool, который замеряет ожидание соединения (включая открытие нового)."""
+    if base not in _timed_pool_classes:
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return base._do_get(self)
+            finally:
+                if pool_wait_observer is not None:
+                    pool_wait_observer(self, time.perf_counter() - started)
+        _timed_pool_classes[base] = type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+    return _timed_pool_classes[base]
+
+def engine_options(url: str, profile: dict) -> dict:
+    """Аргументы create_engine из профиля: пул и кеш скомпилированных запросов."""
+    options = {"query_cache_size": profile["query_cache_size"]}
+    parsed = make_url(url)
+    pool_class = parsed.get_dialect().get_pool_class(parsed)
+    if not issubclass(pool_class, QueuePool):
+        # NullPool/SingletonThreadPool (in-memory SQLite, aiosqlite) не принимают размеры пула
+        return options
+    if settings.METRICS_ENABLED:
+        # Замер ожидания пула нужен только метрикам; без них остаётся штатный класс пула
+        options["poolclass"] = timed_pool_class(pool_class)
+    for key in ("pool_size", "max_overflow", "pool_recycle", "pool_pre_ping"):
+        options[key] = profile[key]
+    return options
+
+def configure_engine(engine: Engine, profile: dict):
+    """Вешает на движок PRAGMA для SQLite и выборочное логирование SQL из профиля."""
+    pragmas = profile.get("sqlite_pragmas") or {}
+    if engine.dialect.name == "sqlite" and pragmas:
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    if profile.get("echo"):
+        _enable_sql_log()
+        sample_rate = profile.get("echo_sample_rate", 1.0)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _log_statement(conn, cursor, statement, parameters, context, executemany):
+            if sample_rate >= 1.0 or random.random() < sample_rate:
+                sql_logger.info("%s %r", statement, parameters)
+
+_sql_log_listener = None
+
+def _enable_sql_log():
+    """SQL пишется через очередь: запись в лог идёт в отдельном потоке, а не в потоке запроса."""
+    global _sql_log_listener
+    if _sql_log_listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    sql_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    sql_logger.setLevel(logging.INFO)
+    sql_logger.propagate = False
+    _sql_log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    _sql_log_listener.start()
+
+def make_engine(url: str) -> Engine:
+    profile = settings.engine_profile()
+    engine = create_engine(url, **engine_options(url, profile))
+    configure_engine(engine, profile)
+    return engine
+
+engine = make_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронные драйверы для DB_ASYNC
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "mysql": "mysql+aiomysql"}
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(
+        hide_password=False)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **engine_options(_async_url, settings.engine_profile()))
+    configure_engine(async_engine.sync_engine, settings.engine_profile())
+    # expire_on_commit=False: после коммита атрибуты читаются без неявного IO вне greenlet
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Маршрутизация чтения на реплики
+def is_primary(db) -> bool:
+    """Сессия (Session или AsyncSession) работает с primary, а не с репликой."""
+    bind = db.get_bind()
+    return bind is engine or (async_engine is not None and bind is async_engine.sync_engine)
+
+PRIMARY_COOKIE = "db_primary_until"
+
+def wants_primary(request) -> bool:
+    """Клиент недавно писал: читаем с primary, пока реплики могут отставать."""
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+class ReadRouter:
+    """
+    Выбирает фабрику сессий для read-only обработчиков: реплики по кругу, либо
+    primary, если реплик нет или клиент недавно писал (read-your-writes).
+    """
+    def __init__(self, primary, replicas=()):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+
+    def sessionmaker_for(self, request=None):
+        if not self.replicas or (request is not None and wants_primary(request)):
+            return self.primary
+        with self._lock:
+            return next(self._cycle)
+
+read_router = ReadRouter(SessionLocal, [
+    sessionmaker(autocommit=False, autoflush=False, bind=make_engine(url)) for url in settings.READ_REPLICA_URLS
+])
+async_read_router = None
+if AsyncSessionLocal is not None:
+    _replica_makers = []
+    for _url in settings.READ_REPLICA_URLS:
+        _replica_engine = create_async_engine(async_database_url(_url), **engine_options(
+            async_database_url(_url), settings.engine_profile()))
+        configure_engine(_replica_engine.sync_engine, settings.engine_profile())
+        _replica_makers.append(async_sessionmaker(_replica_engine, autoflush=False, expire_on_commit=False))
+    async_read_router = ReadRouter(AsyncSessionLocal, _replica_makers)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_session():
+    """
+    Сессия для async-обработчиков: AsyncSession при DB_ASYNC, иначе обычная Session
+    (запросы через неё acrud выполняет в пуле потоков).
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def get_read_session(request: Request):
+    """Как get_session, но для обработчиков, которые только читают: может вернуть сессию реплики."""
+    if async_read_router is not None:
+        async with async_read_router.sessionmaker_for(request)() as session:
+            yield session
+    else:
+        db = read_router.sessionmaker_for(request)()
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Счётчик SQL-запросов и времени в БД в рамках текущего запроса (или блока count_queries)
+class QueryCounter:
+    def __init__(self, parent: "QueryCounter" = None):
+        self.count = 0
+        self.seconds = 0.0
+        # Внешний счётчик: вложенные блоки count_queries учитываются и в нём
+        self.parent = parent
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # Отметка на контексте выполнения: у каждого запроса свой, упавший запрос просто его бросает.
+    # retval=True — SQLAlchemy не оборачивает слушатель ещё одним вызовом
+    if context is not None:
+        context.query_started = time.perf_counter()
+    return statement, parameters
+
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started if context is not None else 0.0
+    counter = _query_counter.get()
+    while counter is not None:
+        counter.count += 1
+        counter.seconds += elapsed
+        counter = counter.parent
+    if query_observer is not None:
+        query_observer(conn, cursor, statement, parameters, executemany, elapsed)
+
+def named_engines() -> Dict[str, Engine]:
+    """Все синхронные движки (primary, реплики, sync-часть async-движков) по именам — для событий и метрик."""
+    engines = {"primary": engine}
+    engines.update((f"replica{i}", maker.kw["bind"]) for i, maker in enumerate(read_router.replicas, 1))
+    if async_read_router is not None:
+        engines["async-primary"] = async_engine.sync_engine
+        engines.update((f"async-replica{i}", maker.kw["bind"].sync_engine)
+                       for i, maker in enumerate(async_read_router.replicas, 1))
+    return engines
+
+def all_engines():
+    return list(named_engines().values())
+
+_queries_instrumented = False
+
+def instrument_queries():
+    """
+    Подключает к движкам счётчик запросов и замер времени (count_queries, query_observer).
+    Вызывают только потребители — метрики, журнал медленных запросов, X-Query-Count, —
+    без них запросы не проходят через лишние события курсора.
+    """
+    global _queries_instrumented
+    if _queries_instrumented:
+        return
+    _queries_instrumented = True
+    for _engine in all_engines():
+        event.listen(_engine, "before_cursor_execute", _start_query_timer, retval=True)
+        event.listen(_engine, "after_cursor_execute", _time_query)
+
+def uninstrument_queries():
+    """Снимает события instrument_queries (бенчмарк накладных расходов сравнивает с ними и без них)."""
+    global _queries_instrumented
+    if not _queries_instrumented:
+        return
+    _queries_instrumented = False
+    for _engine in all_engines():
+        event.remove(_engine, "before_cursor_execute", _start_query_timer)
+        event.remove(_engine, "after_cursor_execute", _time_query)
+
+@contextmanager
+def count_queries():
+    """
+    Считает запросы и время в БД в текущем контексте (нужен instrument_queries). Объект
+    счётчика общий для копий контекста, поэтому учитываются и запросы из пула потоков.
+    """
+    counter = QueryCounter(parent=_query_counter.get())
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
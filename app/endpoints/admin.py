@@ -1,50 +1,68 @@
 # app/endpoints/admin.py
 from fastapi import APIRouter, Request, Depends, HTTPException, status, Form, UploadFile, File
-from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, Response
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import RedirectResponse, HTMLResponse, Response, StreamingResponse
 from datetime import datetime
 from sqlalchemy.orm import Session
-import csv, io, json
-from .. import crud, auth, database, schemas
+import csv, io
+from starlette.concurrency import run_in_threadpool
+from .. import acrud, crud, auth, database, etags, jobs, models, schemas, serializers, slowlog
+from ..cache import CACHES
+from ..config import settings
+from ..passwords import hasher
+from ..templating import stream_template, templates
 
 router = APIRouter(prefix="/admin", tags=["admin"])
-templates = Jinja2Templates(directory="templates")
 
-def get_current_admin(user=Depends(auth.get_current_user)):
+async def get_current_admin(user=Depends(auth.get_current_user)):
     if not user or not user.is_admin:
         raise HTTPException(status_code=403, detail="Access denied. You are not an admin.")
     return user
 
 @router.get("/", response_class=HTMLResponse)
-def admin_home(request: Request, db: Session = Depends(database.get_db),
+async def admin_home(request: Request, db = Depends(database.get_session),
                admin: schemas.UserOut = Depends(get_current_admin)):
-    books = crud.get_books(db, skip=0, limit=100)
-    return templates.TemplateResponse("admin_home.html", {"request": request, "books": books, "admin": admin})
+    books = await acrud.get_books(db, skip=0, limit=100)
+    return stream_template("admin_home.html", {"request": request, "books": books, "admin": admin})
+
+@router.get("/cache-stats")
+async def admin_cache_stats(admin: schemas.UserOut = Depends(get_current_admin)):
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+@router.get("/hasher-stats")
+async def admin_hasher_stats(admin: schemas.UserOut = Depends(get_current_admin)):
+    return hasher.stats()
+
+@router.get("/slow-queries", response_class=HTMLResponse)
+async def admin_slow_queries(request: Request, admin: schemas.UserOut = Depends(get_current_admin)):
+    return templates.TemplateResponse("admin_slow_queries.html", {
+        "request": request, "admin": admin, "records": slowlog.records(),
+        "threshold_ms": settings.SLOW_QUERY_MS, "capacity": settings.SLOW_QUERY_LOG_SIZE,
+    })
 
 @router.get("/book/create", response_class=HTMLResponse)
-def admin_create_book_get(request: Request, admin: schemas.UserOut = Depends(get_current_admin)):
+async def admin_create_book_get(request: Request, admin: schemas.UserOut = Depends(get_current_admin)):
     return templates.TemplateResponse("admin_create_book.html", {"request": request, "admin": admin, "current_year": datetime.now().year})
 
 
 @router.post("/book/create", response_class=HTMLResponse)
-def admin_create_book_post(
+async def admin_create_book_post(
     request: Request,
     title: str = Form(...),
     genre: str = Form(...),
     published_year: int = Form(...),
     authors: str = Form(...),
-    db: Session = Depends(database.get_db),
+    db = Depends(database.get_session),
     admin: schemas.UserOut = Depends(get_current_admin)
 ):
     authors_list = [a.strip() for a in authors.split(",") if a.strip()]
     book_data = schemas.BookCreate(title=title, genre=genre, published_year=published_year, authors=authors_list)
-    crud.create_book(db, book_data)
+    await acrud.create_book(db, book_data)
     return RedirectResponse(url="/admin", status_code=302)
 
 @router.get("/book/{book_id}/edit", response_class=HTMLResponse)
-def admin_edit_book_get(request: Request, book_id: int, db: Session = Depends(database.get_db),
+async def admin_edit_book_get(request: Request, book_id: int, db = Depends(database.get_session),
                         admin: schemas.UserOut = Depends(get_current_admin)):
-    book = crud.get_book(db, book_id)
+    book = await acrud.get_book(db, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     return templates.TemplateResponse("admin_edit_book.html", {"request": request, "book": book, "admin": admin, "current_year": datetime.now().year})
@@ -52,91 +70,122 @@ def admin_edit_book_get(request: Request, book_id: int, db: Session = Depends(da
 
 
 @router.post("/book/{book_id}/edit", response_class=HTMLResponse)
-def admin_edit_book_post(
+async def admin_edit_book_post(
     request: Request,
     book_id: int,
     title: str = Form(...),
     genre: str = Form(...),
     published_year: int = Form(...),
     authors: str = Form(...),
-    db: Session = Depends(database.get_db),
+    db = Depends(database.get_session),
     admin: schemas.UserOut = Depends(get_current_admin)
 ):
     authors_list = [a.strip() for a in authors.split(",") if a.strip()]
     update_data = schemas.BookUpdate(title=title, genre=genre, published_year=published_year, authors=authors_list)
-    updated_book = crud.update_book(db, book_id, update_data)
+    updated_book = await acrud.update_book(db, book_id, update_data)
     if not updated_book:
         raise HTTPException(status_code=404, detail="Book not found")
     return RedirectResponse(url="/admin", status_code=302)
 
 @router.post("/book/{book_id}/delete", response_class=HTMLResponse)
-def admin_delete_book(request: Request, book_id: int, db: Session = Depends(database.get_db),
+async def admin_delete_book(request: Request, book_id: int, db = Depends(database.get_session),
                       admin: schemas.UserOut = Depends(get_current_admin)):
-    crud.delete_book(db, book_id)
+    await acrud.delete_book(db, book_id)
     return RedirectResponse(url="/admin", status_code=302)
 
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+def _export_rows(format: str, session_factory=database.SessionLocal):
+    """
+    Генерирует тело экспорта кусками, по одному на пачку книг из crud.iter_books.
+    Сессия открывается внутри генератора: он живёт дольше, чем зависимость get_db.
+    """
+    db = session_factory()
+    try:
+        books = crud.iter_books(db)
+        if format == "csv":
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(["id", "title", "genre", "published_year", "authors"])
+            for i, book in enumerate(books, 1):
+                authors = ", ".join([a.name for a in book.authors])
+                writer.writerow([book.id, book.title, book.genre, book.published_year, authors])
+                if i % settings.EXPORT_CHUNK_SIZE == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            yield output.getvalue()
+        else:
+            # Быстрый путь: словари BookOut без Pydantic и orjson, побайтно как раньше
+            parts = [] if format == "ndjson" else [b"["]
+            for i, book in enumerate(books):
+                item = serializers.dumps(serializers.book_out(book))
+                if format == "ndjson":
+                    parts.append(item + b"\n")
+                else:
+                    parts.append(item if i == 0 else b"," + item)
+                if len(parts) >= settings.EXPORT_CHUNK_SIZE:
+                    yield b"".join(parts)
+                    parts = []
+            if format == "json":
+                parts.append(b"]")
+            yield b"".join(parts)
+    finally:
+        db.close()
+
+def _catalog_version(session_factory) -> int:
+    with session_factory() as db:
+        return crud.get_catalog_version(db)
+
 @router.get("/export", response_class=Response)
-def admin_export_books(format: str = "json", db: Session = Depends(database.get_db),
-                       admin: schemas.UserOut = Depends(get_current_admin)):
-    books = crud.get_books(db, skip=0, limit=1000)
-    books_data = [schemas.BookOut.from_orm(book).dict() for book in books]
-    if format.lower() == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["id", "title", "genre", "published_year", "authors"])
-        for book in books_data:
-            authors = ", ".join([a["name"] for a in book["authors"]])
-            writer.writerow([book["id"], book["title"], book["genre"], book["published_year"], authors])
-        response = Response(content=output.getvalue(), media_type="text/csv")
-        response.headers["Content-Disposition"] = "attachment; filename=books.csv"
-        return response
-    else:
-        response = JSONResponse(content=books_data)
-        response.headers["Content-Disposition"] = "attachment; filename=books.json"
-        return response
+async def admin_export_books(request: Request, format: str = "json",
+                             admin: schemas.UserOut = Depends(get_current_admin)):
+    format = format.lower()
+    if format not in EXPORT_MEDIA_TYPES:
+        format = "json"
+    session_factory = database.read_router.sessionmaker_for(request)
+    etag = etags.make_etag(await run_in_threadpool(_catalog_version, session_factory), "export", format)
+    cached = etags.not_modified(request, etag)
+    if cached:
+        return cached
+    response = StreamingResponse(_export_rows(format, session_factory), media_type=EXPORT_MEDIA_TYPES[format])
+    response.headers["Content-Disposition"] = f"attachment; filename=books.{format}"
+    response.headers["ETag"] = etag
+    return response
 
 @router.post("/import", response_class=HTMLResponse)
-async def admin_import_books(
+def admin_import_books(
     request: Request,
     file: UploadFile = File(...),
     db: Session = Depends(database.get_db),
     admin: schemas.UserOut = Depends(get_current_admin)
 ):
-    content = await file.read()
-    imported = 0
-    if file.filename.lower().endswith(".csv"):
-        decoded = content.decode("utf-8")
-        reader = csv.DictReader(io.StringIO(decoded))
-        for row in reader:
-            authors_list = [a.strip() for a in row["authors"].split(",") if a.strip()]
-            try:
-                book_data = schemas.BookCreate(
-                    title=row["title"],
-                    genre=row["genre"],
-                    published_year=int(row["published_year"]),
-                    authors=authors_list
-                )
-                crud.create_book(db, book_data)
-                imported += 1
-            except Exception:
-                continue
-    elif file.filename.lower().endswith(".json"):
-        try:
-            data = json.loads(content)
-            for item in data:
-                authors_list = item.get("authors")
-                if isinstance(authors_list, list) and authors_list and isinstance(authors_list[0], dict):
-                    authors_list = [a["name"] for a in authors_list]
-                book_data = schemas.BookCreate(
-                    title=item["title"],
-                    genre=item["genre"],
-                    published_year=int(item["published_year"]),
-                    authors=authors_list
-                )
-                crud.create_book(db, book_data)
-                imported += 1
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid JSON format")
-    else:
+    # Обработчик только копирует загрузку на диск и ставит задачу в очередь:
+    # строки разбирает пул jobs.workers, прогресс — на /admin/import/{job_id}
+    if jobs.file_format(file.filename) is None:
         raise HTTPException(status_code=400, detail="Unsupported file type")
-    return RedirectResponse(url="/admin", status_code=302)
+    job = jobs.create_job(db, file.filename, file.file)
+    jobs.workers.submit(job.id)
+    return RedirectResponse(url=f"/admin/import/{job.id}", status_code=302)
+
+def _get_job(db: Session, job_id: int) -> schemas.ImportJobOut:
+    job = db.get(models.ImportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return jobs.describe(job)
+
+@router.get("/import/{job_id}", response_class=HTMLResponse)
+def admin_import_job(request: Request, job_id: int, db: Session = Depends(database.get_db),
+                     admin: schemas.UserOut = Depends(get_current_admin)):
+    return templates.TemplateResponse("admin_import_job.html", {
+        "request": request, "admin": admin, "job": _get_job(db, job_id), "finished": jobs.FINISHED,
+    })
+
+@router.get("/import/{job_id}/status", response_model=schemas.ImportJobOut)
+def admin_import_job_status(job_id: int, db: Session = Depends(database.get_db),
+                            admin: schemas.UserOut = Depends(get_current_admin)):
+    return _get_job(db, job_id)
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import List, Optional
-from .. import crud, schemas, database, auth
+from .. import acrud, schemas, database, auth, etags
+from ..config import settings
+from ..serializers import FastJSONResponse, books_out
 
 router = APIRouter(
     prefix="/api/books",
@@ -9,40 +10,87 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.BookOut)
-def create_book(book: schemas.BookCreate, db: Session = Depends(database.get_db), current_user = Depends(auth.get_current_user)):
-    return crud.create_book(db, book)
+async def create_book(book: schemas.BookCreate, db = Depends(database.get_session), current_user = Depends(auth.get_current_user)):
+    return await acrud.create_book(db, book)
+
+@router.post("/batch", response_model=schemas.BookBatchResult)
+async def batch_books(batch: schemas.BookBatch, db = Depends(database.get_session), current_user = Depends(auth.get_current_user)):
+    """Создание, изменение и удаление множества книг одной транзакцией; результат — по каждой операции."""
+    if len(batch.create) + len(batch.update) + len(batch.delete) > settings.BOOK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {settings.BOOK_BATCH_MAX_ITEMS} operations")
+    return {"results": await acrud.batch_books(db, batch)}
 
 @router.get("/", response_model=List[schemas.BookOut])
-def read_books(
+async def read_books(
+    request: Request,
     skip: int = 0, 
     limit: int = 10, 
+    cursor: Optional[str] = Query(None),
+    sort_by: Optional[str] = Query(None),
+    order: str = Query("asc"),
     title: Optional[str] = Query(None),
     author: Optional[str] = Query(None),
     genre: Optional[str] = Query(None),
     year_from: Optional[int] = Query(None),
     year_to: Optional[int] = Query(None),
-    db: Session = Depends(database.get_db)
+    db = Depends(database.get_read_session)
+):
+    # Версию читаем до данных: запись между ними даст более новые данные под старым ETag, и клиент перезапросит
+    etag = etags.request_etag(request, await acrud.get_catalog_version(db))
+    cached = etags.not_modified(request, etag)
+    if cached:
+        return cached
+    headers = {"ETag": etag}
+    filters = dict(title=title, author=author, genre=genre, year_from=year_from, year_to=year_to)
+    if skip and not cursor:
+        # Старый режим с OFFSET оставлен для совместимости
+        books = await acrud.get_books(db, skip=skip, limit=limit, sort_by=sort_by, order=order, **filters)
+        return FastJSONResponse(books_out(books), headers=headers)
+    try:
+        books, next_cursor, prev_cursor = await acrud.get_books_page(
+            db, cursor=cursor, limit=limit, sort_by=sort_by, order=order, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    links = []
+    for rel, token, header in (("next", next_cursor, "X-Next-Cursor"), ("prev", prev_cursor, "X-Prev-Cursor")):
+        if token:
+            headers[header] = token
+            links.append(f'<{request.url.include_query_params(cursor=token)}>; rel="{rel}"')
+    if links:
+        headers["Link"] = ", ".join(links)
+    # Ответ собирается напрямую: response_model остаётся для схемы OpenAPI, но не валидирует каждую книгу
+    return FastJSONResponse(books_out(books), headers=headers)
+
+@router.get("/search", response_model=List[schemas.BookOut])
+async def search_books(
+    q: str = Query(..., min_length=1),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db = Depends(database.get_read_session)
 ):
-    # Можно расширить фильтрацию по полям
-    return crud.get_books(db, skip=skip, limit=limit)
+    return FastJSONResponse(books_out(await acrud.search_books(db, q, skip=skip, limit=limit)))
 
 @router.get("/{book_id}", response_model=schemas.BookOut)
-def read_book(book_id: int, db: Session = Depends(database.get_db)):
-    db_book = crud.get_book(db, book_id)
-    if db_book is None:
+async def read_book(book_id: int, request: Request, db = Depends(database.get_read_session)):
+    etag = etags.request_etag(request, await acrud.get_catalog_version(db))
+    cached = etags.not_modified(request, etag)
+    if cached:
+        return cached
+    book = await acrud.get_book_out(db, book_id)
+    if book is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    return db_book
+    return FastJSONResponse(book, headers={"ETag": etag})
 
 @router.put("/{book_id}", response_model=schemas.BookOut)
-def update_book(book_id: int, book: schemas.BookUpdate, db: Session = Depends(database.get_db), current_user = Depends(auth.get_current_user)):
-    db_book = crud.update_book(db, book_id, book)
+async def update_book(book_id: int, book: schemas.BookUpdate, db = Depends(database.get_session), current_user = Depends(auth.get_current_user)):
+    db_book = await acrud.update_book(db, book_id, book)
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
     return db_book
 
 @router.delete("/{book_id}")
-def delete_book(book_id: int, db: Session = Depends(database.get_db), current_user = Depends(auth.get_current_user)):
-    db_book = crud.delete_book(db, book_id)
+async def delete_book(book_id: int, db = Depends(database.get_session), current_user = Depends(auth.get_current_user)):
+    db_book = await acrud.delete_book(db, book_id)
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
     return {"detail": "Book deleted successfully"}
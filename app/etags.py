@@ -0,0 +1,32 @@
+# app/etags.py
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+# Условные GET: ETag строится из версии каталога (crud.CATALOG_VERSION) и того, что
+# определяет представление (путь, параметры запроса, формат). Любая запись книг
+# меняет версию, поэтому совпавший ETag означает, что ответ был бы тем же самым.
+
+
+def make_etag(version: int, *parts) -> str:
+    """Сильный ETag: версия каталога плюс дайджест частей, задающих представление."""
+    digest = hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def request_etag(request: Request, version: int, *parts) -> str:
+    return make_etag(version, request.url.path, request.url.query, *parts)
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    Ответ 304, если If-None-Match совпадает с etag, иначе None. Для If-None-Match
+    сравнение слабое (RFC 9110), поэтому префикс W/ не мешает совпадению.
+    """
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in candidates or etag in candidates:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
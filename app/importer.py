@@ -0,0 +1,213 @@
+# app/importer.py
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+from typing import BinaryIO, Callable, Iterable, Iterator, List, NamedTuple, Optional
+from . import schemas
+from .config import settings
+
+# Сколько байт читаем из загруженного файла за раз
+READ_CHUNK_SIZE = 64 * 1024
+# Предел для одного JSON-объекта: защищает от чтения всего файла в память при битом JSON
+MAX_JSON_OBJECT_SIZE = 1024 * 1024
+
+# Сколько ошибок по строкам хранится в отчёте импорта (счётчик rejected — по всем)
+MAX_REPORTED_ERRORS = 100
+MIN_PUBLISHED_YEAR = 1800
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_csv_records(fileobj: BinaryIO, encoding: str = "utf-8") -> Iterator[dict]:
+    """
+    Построчно читает CSV из бинарного файла. Декодирование идёт кусками через
+    TextIOWrapper, поэтому в памяти держится только текущая строка.
+    """
+    text = io.TextIOWrapper(fileobj, encoding=encoding, newline="")
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        # Не даём обёртке закрыть исходный файл UploadFile
+        text.detach()
+
+
+def iter_json_array(fileobj: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """
+    Инкрементально разбирает JSON-массив верхнего уровня и отдаёт элементы по
+    одному. В буфере держится не больше одного элемента и одного блока чтения.
+    Бросает ValueError, если документ не является корректным JSON-массивом.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = fileobj.read(chunk_size)
+        if not data:
+            eof = True
+            buf = buf[pos:] + decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + decoder.decode(data)
+        pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_ws()
+    if buf.startswith("\ufeff", pos):
+        pos += 1
+        skip_ws()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    skip_ws()
+    if pos < len(buf) and buf[pos] == "]":
+        return
+
+    while True:
+        skip_ws()
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            item, end = None, None
+        # Значение, упёршееся в конец буфера, может быть обрезано (например, число)
+        if end is None or (end == len(buf) and not eof):
+            if eof:
+                raise ValueError("Malformed JSON array element")
+            if len(buf) - pos > MAX_JSON_OBJECT_SIZE:
+                raise ValueError("JSON array element is too large")
+            fill()
+            continue
+        pos = end
+        yield item
+        skip_ws()
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if buf[pos] != ",":
+            raise ValueError("Expected ',' or ']' in JSON array")
+        pos += 1
+
+
+class ImportedBook(NamedTuple):
+    """Проверенная строка импорта: те же поля, что у schemas.BookCreate, без накладных расходов модели."""
+    title: str
+    genre: str
+    published_year: int
+    authors: List[str]
+
+
+class ImportReport:
+    """Итог проверки строк импорта: число отклонённых и первые ошибки (строка, поле, сообщение)."""
+
+    def __init__(self, max_errors: int = MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.rejected = 0
+        self.errors: List[schemas.ImportRowError] = []
+
+    def reject(self, row: int, field: str, message: str):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(schemas.ImportRowError(row=row, field=field, message=message))
+
+
+def csv_authors(value) -> Optional[list]:
+    """Колонка authors из CSV: имена через запятую."""
+    if not isinstance(value, str):
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def json_authors(value) -> Optional[list]:
+    """Поле authors из JSON: список имён или список объектов {"name": ...} (как в экспорте)."""
+    if not isinstance(value, list):
+        return None
+    return [a.get("name") if isinstance(a, dict) else a for a in value]
+
+
+def _year(value) -> Optional[int]:
+    # Как int(...) в прежнем построчном коде, но без исключений и без bool
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def validate_books(rows: List, first_row: int, report: ImportReport,
+                   authors: Callable = json_authors) -> List[ImportedBook]:
+    """
+    Проверяет пачку строк импорта по колонкам, а не по объектам: жанр против
+    ALLOWED_GENRES, год в диапазоне, непустые название и авторы (те же правила, что у
+    schemas.BookCreate). Текущий год берётся один раз на пачку. Прошедшие строки
+    возвращаются как ImportedBook; отклонённые попадают в report с номером строки (с first_row).
+    """
+    errors = {}
+
+    def fail(index: int, field: str, message: str):
+        errors.setdefault(index, (field, message))
+
+    records = []
+    for i, row in enumerate(rows):
+        if isinstance(row, dict):
+            records.append(row)
+        else:
+            records.append({})
+            fail(i, "row", "Row must be an object")
+
+    titles = [row.get("title") for row in records]
+    for i, title in enumerate(titles):
+        if not isinstance(title, str) or not title.strip():
+            fail(i, "title", "Title must be a non-empty string")
+
+    genres = [row.get("genre") for row in records]
+    for i, genre in enumerate(genres):
+        if not isinstance(genre, str) or genre not in schemas.ALLOWED_GENRES:
+            fail(i, "genre", f"Genre must be one of {sorted(schemas.ALLOWED_GENRES)}")
+
+    current_year = datetime.now().year
+    years = [_year(row.get("published_year")) for row in records]
+    for i, year in enumerate(years):
+        if year is None or not MIN_PUBLISHED_YEAR <= year <= current_year:
+            fail(i, "published_year", f"Published year must be an integer between {MIN_PUBLISHED_YEAR} and {current_year}")
+
+    author_lists = [authors(row.get("authors")) for row in records]
+    for i, names in enumerate(author_lists):
+        if names is None or not all(isinstance(name, str) and name.strip() for name in names):
+            fail(i, "authors", "Authors must be a list of non-empty names")
+
+    for i in sorted(errors):
+        report.reject(first_row + i, *errors[i])
+    return [
+        ImportedBook(*fields)
+        for i, fields in enumerate(zip(titles, genres, years, author_lists))
+        if i not in errors
+    ]
+
+
+def iter_valid_books(rows: Iterable, report: ImportReport, authors: Callable = json_authors,
+                     chunk_size: int = None) -> Iterator[ImportedBook]:
+    """Проверяет строки пачками по chunk_size и отдаёт прошедшие проверку книги."""
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    rows = iter(rows)
+    first_row = 1
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from validate_books(chunk, first_row, report, authors)
+        first_row += len(chunk)
@@ -0,0 +1,266 @@
+# app/jobs.py
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import BinaryIO, Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from . import crud, importer, models, schemas
+from .config import settings
+from .database import SessionLocal
+
+# Фоновый импорт: POST /admin/import только копирует загрузку на диск и записывает
+# задачу в import_jobs, а строки разбирает пул потоков. Прогресс задачи коммитится
+# в одной транзакции с каждой пачкой книг, поэтому после перезапуска задача
+# продолжается с первой незакоммиченной строки, без повторного импорта.
+# Выполняемая задача принадлежит одному воркеру (owner) и продлевает аренду
+# (heartbeat_at) каждой пачкой; другие процессы забирают только задачи с
+# просроченной арендой, а воркер, у которого задачу забрали, останавливается.
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+FORMATS = {".csv": "csv", ".json": "json"}
+
+# Идентификатор этого процесса как владельца задач
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseLost(Exception):
+    """Аренду задачи забрал другой воркер — текущий прекращает импорт."""
+
+
+def file_format(filename: str) -> Optional[str]:
+    """csv/json по расширению файла или None, если формат не поддерживается."""
+    return FORMATS.get(os.path.splitext(filename.lower())[1])
+
+
+def spool_dir() -> str:
+    path = settings.IMPORT_SPOOL_DIR or os.path.join(tempfile.gettempdir(), "book-imports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def create_job(db: Session, filename: str, fileobj: BinaryIO) -> models.ImportJob:
+    """Копирует загрузку в каталог очереди и записывает задачу (pending). В очередь её ставит workers.submit."""
+    format = file_format(filename)
+    fd, path = tempfile.mkstemp(suffix="." + format, dir=spool_dir())
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            shutil.copyfileobj(fileobj, spool, importer.READ_CHUNK_SIZE)
+        job = models.ImportJob(
+            filename=filename, format=format, path=path, status=PENDING,
+            total_bytes=os.path.getsize(path), created_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+    except Exception:
+        os.remove(path)
+        raise
+    return job
+
+
+def _claim(db: Session, job_id: int) -> bool:
+    # Атомарно pending -> running с этим воркером во владельцах: одну задачу не возьмут два потока
+    result = db.execute(
+        update(models.ImportJob)
+        .where(models.ImportJob.id == job_id, models.ImportJob.status == PENDING)
+        .values(status=RUNNING, owner=WORKER_ID, heartbeat_at=datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _renew_lease(db: Session, job_id: int):
+    """Продлевает аренду в текущей транзакции; LeaseLost, если задача уже не наша."""
+    result = db.execute(
+        update(models.ImportJob)
+        .where(models.ImportJob.id == job_id, models.ImportJob.owner == WORKER_ID,
+               models.ImportJob.status == RUNNING)
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    if result.rowcount != 1:
+        raise LeaseLost(f"Import job {job_id} was taken over by another worker")
+
+
+def _import(db: Session, job: models.ImportJob):
+    report = importer.ImportReport()
+    report.rejected = job.rejected
+    report.errors = [schemas.ImportRowError(**error) for error in job.errors or []]
+    author_ids = {}
+    with open(job.path, "rb") as fileobj:
+        if job.format == "csv":
+            rows, authors = importer.iter_csv_records(fileobj), importer.csv_authors
+        else:
+            rows, authors = importer.iter_json_array(fileobj), importer.json_authors
+        # После перезапуска пропускаем строки, уже закоммиченные вместе с прогрессом задачи
+        for _ in islice(rows, job.processed):
+            pass
+        first_row = job.processed + 1
+        while True:
+            chunk = list(islice(rows, settings.IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            books = importer.validate_books(chunk, first_row, report, authors)
+            first_row += len(chunk)
+            job.processed += len(chunk)
+            job.imported += len(books)
+            job.rejected = report.rejected
+            job.errors = [error.dict() for error in report.errors]
+            job.bytes_processed = fileobj.tell()
+            _renew_lease(db, job.id)
+            if books:
+                # Изменения job уходят тем же коммитом, что и книги пачки
+                crud.bulk_create_books(db, books, chunk_size=len(books), author_ids=author_ids)
+            else:
+                db.commit()
+    job.bytes_processed = job.total_bytes
+
+
+def run_job(job_id: int):
+    """Выполняет задачу импорта в отдельной сессии; ошибки записываются в задачу."""
+    with SessionLocal() as db:
+        if not _claim(db, job_id):
+            return
+        job = db.get(models.ImportJob, job_id)
+        if job.started_at is None:
+            job.started_at = datetime.utcnow()
+            db.commit()
+        try:
+            _import(db, job)
+            job.status = DONE
+        except LeaseLost:
+            db.rollback()
+            logger.warning("Import job %d was taken over by another worker, stopping", job_id)
+            return
+        except Exception as exc:
+            db.rollback()
+            if isinstance(exc, ValueError):
+                # Битый JSON, неверная кодировка CSV
+                job.error = f"Invalid {job.format.upper()} file: {exc}"
+            else:
+                logger.exception("Import job %d failed", job_id)
+                job.error = str(exc)
+            job.status = FAILED
+        job.finished_at = datetime.utcnow()
+        try:
+            # Итог пишет только владелец: задачу могли забрать, пока шла последняя пачка
+            _renew_lease(db, job_id)
+        except LeaseLost:
+            db.rollback()
+            logger.warning("Import job %d was taken over by another worker, stopping", job_id)
+            return
+        db.commit()
+        status = describe(job)
+        path = job.path
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    logger.info("Import job %d %s: %d imported, %d rejected, %.1f rows/s", job_id, status.status,
+                status.imported, status.rejected, status.rows_per_second)
+    for error in status.errors:
+        logger.info("Import job %d row %d rejected: %s: %s", job_id, error.row, error.field, error.message)
+
+
+def describe(job: models.ImportJob) -> schemas.ImportJobOut:
+    """Состояние задачи для страницы /admin/import/{job_id}: прогресс, скорость и оценка оставшегося времени."""
+    elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds() if job.started_at else 0.0
+    if job.status == DONE:
+        progress = 1.0
+    else:
+        progress = min(job.bytes_processed / job.total_bytes, 1.0) if job.total_bytes else 0.0
+    eta = None
+    if job.status == RUNNING and progress > 0:
+        eta = round(elapsed * (1 - progress) / progress, 1)
+    return schemas.ImportJobOut(
+        id=job.id,
+        filename=job.filename,
+        status=job.status,
+        processed=job.processed,
+        imported=job.imported,
+        rejected=job.rejected,
+        rows_per_second=round(job.processed / elapsed, 1) if elapsed > 0 else 0.0,
+        progress=round(progress, 4),
+        eta_seconds=eta,
+        error=job.error,
+        errors=job.errors or [],
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+class ImportWorkers:
+    """Пул потоков фонового импорта внутри процесса приложения."""
+
+    def __init__(self, max_workers: int, lease_seconds: int):
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import")
+        self._reaper: Optional[threading.Thread] = None
+        # RLock: если задача уже завершилась, add_done_callback вызывает _forget сразу, под этой же блокировкой
+        self._lock = threading.RLock()
+        self._queued: Dict[int, Future] = {}
+
+    def submit(self, job_id: int) -> Future:
+        # Уже стоящую в очереди этого процесса задачу повторно не ставим (periodic resume)
+        with self._lock:
+            future = self._queued.get(job_id)
+            if future is None:
+                future = self._queued[job_id] = self._executor.submit(run_job, job_id)
+                future.add_done_callback(lambda _: self._forget(job_id))
+        return future
+
+    def _forget(self, job_id: int):
+        with self._lock:
+            self._queued.pop(job_id, None)
+
+    def resume(self) -> List[Future]:
+        """
+        Ставит в очередь ожидающие задачи и задачи, чей владелец пропал (аренда
+        просрочена). Живые задачи других процессов и потоков не трогает.
+        """
+        expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        with SessionLocal() as db:
+            db.execute(
+                update(models.ImportJob)
+                .where(models.ImportJob.status == RUNNING,
+                       models.ImportJob.heartbeat_at.is_(None) | (models.ImportJob.heartbeat_at < expired))
+                .values(status=PENDING, owner=None)
+            )
+            db.commit()
+            job_ids = list(db.scalars(
+                select(models.ImportJob.id).where(models.ImportJob.status == PENDING).order_by(models.ImportJob.id)
+            ))
+        # Задачу, уже поставленную в очередь здесь или в другом процессе, выполнит только один: см. _claim
+        return [self.submit(job_id) for job_id in job_ids]
+
+    def start(self):
+        """Подхватывает незавершённые задачи сейчас и затем раз в lease_seconds (упавшие воркеры)."""
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while True:
+                try:
+                    self.resume()
+                except Exception:
+                    logger.exception("Resuming import jobs failed")
+                time.sleep(self.lease_seconds)
+
+        self._reaper = threading.Thread(target=reap, name="import-reaper", daemon=True)
+        self._reaper.start()
+
+
+workers = ImportWorkers(max_workers=settings.IMPORT_WORKERS, lease_seconds=settings.IMPORT_LEASE_SECONDS)
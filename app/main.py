@@ -1,11 +1,26 @@
 # app/main.py
-from fastapi import FastAPI
-from .database import engine, SessionLocal
-from . import models, crud, schemas
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.schema import CreateIndex
+from . import database, jobs, metrics, models, crud, schemas, search, slowlog
+from .config import settings
+from .database import engine, SessionLocal, count_queries
+from .passwords import HasherOverloaded
 from .endpoints import books, users, web, admin
 
 # Создаем таблицы, если не используются миграции
 models.Base.metadata.create_all(bind=engine)
+# create_all не добавляет индексы в уже существующие таблицы — досоздаём их отдельно.
+# IF NOT EXISTS вместо checkfirst: рефлексия не видит индексы по выражениям (lower(title))
+with engine.begin() as conn:
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+search.ensure_index(engine)
+# Строка-счётчик книг заполняется здесь, на primary, а не при первом чтении
+with SessionLocal() as db:
+    crud.seed_counters(db)
 
 app = FastAPI(
     title="Book Management System API",
@@ -23,6 +38,50 @@ def create_root_admin():
         crud.create_user(db, admin_data, is_admin=True)
     db.close()
 
+# Импорты, прерванные перезапуском или падением воркера, продолжаются с последней закоммиченной пачки
+@app.on_event("startup")
+def resume_import_jobs():
+    jobs.workers.start()
+
+# Количество SQL-запросов на HTTP-запрос в заголовке X-Query-Count — только если включено в профиле (test)
+if settings.engine_profile()["query_count_header"]:
+    database.instrument_queries()
+
+    @app.middleware("http")
+    async def query_count_header(request: Request, call_next):
+        with count_queries() as counter:
+            response = await call_next(request)
+        response.headers["X-Query-Count"] = str(counter.count)
+        return response
+
+# Read-your-writes: после успешной записи клиент какое-то время читает с primary, а не с реплики
+if database.read_router.replicas:
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            response.set_cookie(database.PRIMARY_COOKIE, str(time.time() + settings.READ_YOUR_WRITES_SECONDS),
+                                max_age=settings.READ_YOUR_WRITES_SECONDS, httponly=True)
+        return response
+
+# Метрики Prometheus: задержки по маршрутам, запросы и время в БД, пул, bcrypt, кеши
+if settings.METRICS_ENABLED:
+    metrics.install()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Журнал медленных запросов с планами выполнения (/admin/slow-queries)
+if slowlog.threshold is not None:
+    slowlog.install()
+    app.add_middleware(slowlog.RequestScopeMiddleware)
+
+@app.exception_handler(HasherOverloaded)
+async def hasher_overloaded(request: Request, exc: HasherOverloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Подключаем роутеры
 app.include_router(books.router)
 app.include_router(users.router)
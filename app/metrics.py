@@ -0,0 +1,184 @@
+# app/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+from . import database
+from .cache import CACHES
+from .passwords import hasher
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей. Гистограммы
+# обновляются на горячем пути (middleware, события пула и bcrypt), остальное —
+# счётчики кешей, пула и bcrypt — читается из самих объектов в момент опроса /metrics.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in sorted(values):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format(bound)
+                bucket_labels = _labels(self.labelnames, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_format(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def _family(name: str, kind: str, documentation: str, samples: Iterable[Tuple[Sequence[str], Sequence, float]]) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(names, values)} {_format(value)}" for names, values, value in samples]
+    return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ("route",), QUERY_COUNT_BUCKETS)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per HTTP request", ("route",))
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time to obtain a connection from the pool", ("engine",))
+hash_duration = Histogram(
+    "password_hash_duration_seconds", "Duration of a single bcrypt hash or verify", (), HASH_BUCKETS)
+
+HISTOGRAMS = (request_latency, request_queries, request_db_time, pool_wait, hash_duration)
+
+_pool_names: Dict[int, str] = {}
+
+
+def _observe_pool_wait(pool, seconds: float):
+    pool_wait.observe(seconds, _pool_names.get(id(pool), "other"))
+
+
+def _observe_hash(seconds: float):
+    hash_duration.observe(seconds)
+
+
+def install():
+    """Подключает замеры запросов, пула и bcrypt. Вызывается один раз при старте приложения."""
+    database.instrument_queries()
+    for name, engine in database.named_engines().items():
+        _pool_names[id(engine.pool)] = name
+    database.pool_wait_observer = _observe_pool_wait
+    hasher.duration_observer = _observe_hash
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware (не BaseHTTPMiddleware — меньше накладных расходов): задержка по
+    шаблону маршрута, число SQL-запросов и время в БД на запрос.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with database.count_queries() as counter:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # Шаблон пути, а не сам путь: /api/books/{book_id}, иначе метки не ограничены
+                route = getattr(scope.get("route"), "path", "unmatched")
+                request_latency.observe(time.perf_counter() - started, scope["method"], route, status)
+                request_queries.observe(counter.count, route)
+                request_db_time.observe(counter.seconds, route)
+
+
+def _pool_samples():
+    for name, engine in database.named_engines().items():
+        pool = engine.pool
+        if hasattr(pool, "checkedout"):
+            yield name, pool
+
+
+def render() -> str:
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.collect()
+
+    pools = list(_pool_samples())
+    lines += _family("db_pool_size", "gauge", "Configured pool size",
+                     ((("engine",), (name,), pool.size()) for name, pool in pools))
+    lines += _family("db_pool_checked_out", "gauge", "Connections currently checked out",
+                     ((("engine",), (name,), pool.checkedout()) for name, pool in pools))
+    lines += _family("db_pool_overflow", "gauge", "Connections open above pool_size",
+                     ((("engine",), (name,), max(pool.overflow(), 0)) for name, pool in pools))
+
+    stats = hasher.stats()
+    lines += _family("password_hash_operations_total", "counter", "Completed bcrypt operations",
+                     [((), (), stats["completed"])])
+    lines += _family("password_hash_seconds_total", "counter", "Total time spent in bcrypt",
+                     [((), (), float(stats["busy_seconds"]))])
+    lines += _family("password_hash_rejected_total", "counter", "bcrypt operations rejected with 503",
+                     [((), (), stats["rejected"])])
+    lines += _family("password_hash_queue", "gauge", "bcrypt operations by state",
+                     [(("state",), ("active",), stats["active"]), (("state",), ("queued",), stats["queued"])])
+
+    caches = sorted(CACHES.items())
+    cache_stats = [(name, cache.stats()) for name, cache in caches]
+    lines += _family("cache_hits_total", "counter", "Cache hits",
+                     ((("cache",), (name,), s["hits"]) for name, s in cache_stats))
+    lines += _family("cache_misses_total", "counter", "Cache misses",
+                     ((("cache",), (name,), s["misses"]) for name, s in cache_stats))
+    lines += _family("cache_hit_ratio", "gauge", "Cache hit ratio since start",
+                     ((("cache",), (name,), float(s["hit_ratio"])) for name, s in cache_stats))
+    lines += _family("cache_entries", "gauge", "Entries in in-process caches",
+                     ((("cache",), (name,), s["size"]) for name, s in cache_stats if "size" in s))
+    return "\n".join(lines) + "\n"
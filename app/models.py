@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, JSON, Table, func
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -7,8 +7,8 @@ Base = declarative_base()
 book_author = Table(
     'book_author',
     Base.metadata,
-    Column('book_id', Integer, ForeignKey('books.id')),
-    Column('author_id', Integer, ForeignKey('authors.id'))
+    Column('book_id', Integer, ForeignKey('books.id'), index=True),
+    Column('author_id', Integer, ForeignKey('authors.id'), index=True)
 )
 
 class Book(Base):
@@ -16,10 +16,14 @@ class Book(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    genre = Column(String, nullable=False)
-    published_year = Column(Integer, nullable=False)
+    genre = Column(String, nullable=False, index=True)
+    published_year = Column(Integer, nullable=False, index=True)
     
-    authors = relationship("Author", secondary=book_author, back_populates="books")
+    # Регистронезависимый поиск по префиксу названия идёт по диапазону lower(title)
+    __table_args__ = (Index("ix_books_title_lower", func.lower(title)),)
+
+    # selectin: авторы подгружаются и при refresh, без ленивой загрузки (нужно для AsyncSession)
+    authors = relationship("Author", secondary=book_author, back_populates="books", lazy="selectin")
 
 class Author(Base):
     __tablename__ = "authors"
@@ -36,3 +40,32 @@ class User(Base):
     username = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_admin = Column(Boolean, default=False)  # Новый флаг для администратора
+
+class CatalogCounter(Base):
+    """Поддерживаемые счётчики каталога (например, число книг), обновляются вместе с записью."""
+    __tablename__ = "catalog_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class ImportJob(Base):
+    """Фоновый импорт книг: загрузка лежит в каталоге очереди, прогресс коммитится вместе с каждой пачкой."""
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String, nullable=False)
+    format = Column(String, nullable=False)  # csv или json
+    path = Column(String, nullable=False)  # копия загрузки в IMPORT_SPOOL_DIR
+    status = Column(String, nullable=False, default="pending", index=True)
+    total_bytes = Column(Integer, nullable=False, default=0)
+    bytes_processed = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)  # прочитано строк файла
+    imported = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON)  # первые ошибки по строкам (schemas.ImportRowError)
+    error = Column(String)  # почему задача завершилась с ошибкой
+    owner = Column(String)  # воркер (хост:pid:…), который выполняет задачу
+    heartbeat_at = Column(DateTime)  # продлевается каждой пачкой; просроченная аренда — задачу можно забрать
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -0,0 +1,90 @@
+# app/passwords.py
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from passlib.context import CryptContext
+from .config import settings
+
+
+class HasherOverloaded(Exception):
+    """Очередь на хеширование переполнена — запрос нужно отклонить (503)."""
+
+
+class PasswordHasher:
+    """
+    Общий сервис bcrypt. Хеширование и проверка идут в отдельном пуле потоков
+    (bcrypt отпускает GIL), поэтому всплеск логинов не занимает пул потоков
+    Starlette и не тормозит чтение каталога. Сверх max_queue ожидающих задач
+    новые отклоняются с HasherOverloaded.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        # Вызывается с длительностью каждой операции bcrypt; ставит app.metrics
+        self.duration_observer = None
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.busy_seconds += elapsed
+            if self.duration_observer is not None:
+                self.duration_observer(elapsed)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HasherOverloaded("Too many concurrent password operations")
+            self.queued += 1
+        future = self._executor.submit(self._run, fn, *args)
+        future.add_done_callback(self._release_cancelled)
+        return future
+
+    def _release_cancelled(self, future: Future):
+        # Отменённая до старта задача (клиент отключился) не попадает в _run — освобождаем место в очереди здесь
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self._submit(self.context.verify, password, hashed_password))
+
+    def hash_sync(self, password: str) -> str:
+        """Для синхронного кода (crud, старт приложения): ждёт результат из того же пула."""
+        return self._submit(self.context.hash, password).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "busy_seconds": round(self.busy_seconds, 3),
+            }
+
+
+hasher = PasswordHasher(max_workers=settings.PASSWORD_HASH_WORKERS, max_queue=settings.PASSWORD_HASH_MAX_QUEUE)
@@ -97,6 +97,53 @@ class BookOut(BookBase):
         orm_mode = True
         from_attributes = True
 
+class BookBatchUpdate(BookUpdate):
+    id: int
+
+class BookBatch(BaseModel):
+    """Пакет операций над книгами: выполняется одной транзакцией."""
+    create: List[BookCreate] = []
+    update: List[BookBatchUpdate] = []
+    delete: List[int] = []
+
+class BookBatchItemResult(BaseModel):
+    op: str  # create / update / delete
+    id: Optional[int] = None
+    status: int  # 201, 200 или 404
+    book: Optional[BookOut] = None
+    detail: Optional[str] = None
+
+class BookBatchResult(BaseModel):
+    results: List[BookBatchItemResult]
+
+class ImportRowError(BaseModel):
+    row: int  # номер строки данных, с 1
+    field: str
+    message: str
+
+class ImportStats(BaseModel):
+    imported: int
+    rejected: int = 0
+    seconds: float
+    rows_per_second: float
+    errors: List[ImportRowError] = []
+
+class ImportJobOut(BaseModel):
+    id: int
+    filename: str
+    status: str  # pending, running, done, failed
+    processed: int
+    imported: int
+    rejected: int
+    rows_per_second: float
+    progress: float  # доля прочитанного файла, 0..1
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    errors: List[ImportRowError] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,124 @@
+# app/search.py
+from typing import Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import Integer, cast, func, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from . import models
+
+# Полнотекстовый поиск по названию и авторам.
+# SQLite: виртуальная таблица FTS5 books_fts (rowid = books.id), синхронизируется из crud.
+# PostgreSQL: tsvector по books.title и authors.name с GIN-индексами.
+# Остальные бэкенды: search_book_ids возвращает None, и crud ищет через ILIKE.
+
+FTS_TABLE = "books_fts"
+
+_fts_ready = False
+
+# Сколько id связывается в одном IN: старые сборки SQLite (до 3.32) принимают не больше 999 параметров
+ID_BATCH = 500
+
+
+def ensure_index(engine: Engine):
+    """Создаёт поисковый индекс, если его нет, и заполняет его из существующих книг."""
+    global _fts_ready
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+            ).first()
+            if not exists:
+                try:
+                    conn.execute(text(
+                        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                        "title, authors, tokenize = 'unicode61 remove_diacritics 2')"
+                    ))
+                except Exception:
+                    # SQLite собран без FTS5 — остаёмся на ILIKE
+                    return
+                conn.execute(text(_SQLITE_REINDEX_SQL.format(where="")))
+            _fts_ready = True
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_books_title_fts ON books USING gin (to_tsvector('simple', title))"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_authors_name_fts ON authors USING gin (to_tsvector('simple', name))"
+            ))
+
+
+_SQLITE_REINDEX_SQL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, authors) "
+    "SELECT books.id, books.title, coalesce(group_concat(authors.name, ' '), '') FROM books "
+    "LEFT JOIN book_author ON book_author.book_id = books.id "
+    "LEFT JOIN authors ON authors.id = book_author.author_id "
+    "{where} GROUP BY books.id"
+)
+
+
+def _use_fts(db: Session) -> bool:
+    return _fts_ready and db.get_bind().dialect.name == "sqlite"
+
+
+def index_books(db: Session, book_ids: Iterable[int]):
+    """Переиндексирует книги в текущей транзакции (вызывать после flush)."""
+    book_ids = list(book_ids)
+    if not book_ids or not _use_fts(db):
+        return
+    remove_books(db, book_ids)
+    for placeholders, params in _id_batches(book_ids):
+        db.execute(text(_SQLITE_REINDEX_SQL.format(where=f"WHERE books.id IN ({placeholders})")), params)
+
+
+def remove_books(db: Session, book_ids: Iterable[int]):
+    book_ids = list(book_ids)
+    if not book_ids or not _use_fts(db):
+        return
+    for placeholders, params in _id_batches(book_ids):
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})"), params)
+
+
+def _id_batches(book_ids: List[int]) -> Iterator[Tuple[str, dict]]:
+    """Плейсхолдеры и параметры для IN по ID_BATCH id за раз."""
+    for start in range(0, len(book_ids), ID_BATCH):
+        batch = book_ids[start:start + ID_BATCH]
+        placeholders = ", ".join(f":id{i}" for i in range(len(batch)))
+        yield placeholders, {f"id{i}": book_id for i, book_id in enumerate(batch)}
+
+
+def _fts_query(q: str) -> str:
+    """Превращает пользовательский ввод в безопасный запрос FTS5: все слова, последнее — по префиксу."""
+    terms = ['"' + word.replace('"', '""') + '"' for word in q.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_book_ids(db: Session, q: str, skip: int = 0, limit: int = 10) -> Optional[List[int]]:
+    """
+    Возвращает id книг, подходящих под запрос, в порядке релевантности,
+    или None, если у бэкенда нет полнотекстового индекса.
+    """
+    dialect = db.get_bind().dialect.name
+    if _use_fts(db):
+        rows = db.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q ORDER BY rank LIMIT :limit OFFSET :skip"),
+            {"q": _fts_query(q), "limit": limit, "skip": skip},
+        )
+        return [row[0] for row in rows]
+    if dialect == "postgresql":
+        tsquery = func.plainto_tsquery("simple", q)
+        author_match = (
+            select(models.book_author.c.book_id)
+            .join(models.Author, models.Author.id == models.book_author.c.author_id)
+            .where(func.to_tsvector("simple", models.Author.name).op("@@")(tsquery))
+        )
+        title_vector = func.to_tsvector("simple", models.Book.title)
+        rank = func.ts_rank(title_vector, tsquery) + cast(models.Book.id.in_(author_match), Integer)
+        stmt = (
+            select(models.Book.id)
+            .where(or_(title_vector.op("@@")(tsquery), models.Book.id.in_(author_match)))
+            .order_by(rank.desc(), models.Book.id)
+            .offset(skip).limit(limit)
+        )
+        return list(db.execute(stmt).scalars())
+    return None
@@ -0,0 +1,44 @@
+# app/serializers.py
+# Быстрый путь сериализации книг для ответов со списками: словари собираются прямо из
+# ORM-объектов без валидации Pydantic, а JSON кодируется orjson. Результат побайтно
+# совпадает с тем, что отдаёт FastAPI через response_model=schemas.BookOut и JSONResponse.
+import json
+from typing import Any, Iterable, List
+from fastapi.responses import JSONResponse
+from . import models
+
+try:
+    import orjson
+except ImportError:  # без orjson — тот же формат через стандартный json
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON в формате JSONResponse: компактный, UTF-8 без \\u-экранирования."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Порядок ключей — как у полей schemas.AuthorOut и schemas.BookOut
+def author_out(author: models.Author) -> dict:
+    return {"name": author.name, "id": author.id}
+
+
+def book_out(book: models.Book) -> dict:
+    return {
+        "title": book.title,
+        "genre": book.genre,
+        "published_year": book.published_year,
+        "id": book.id,
+        "authors": [author_out(author) for author in book.authors],
+    }
+
+
+def books_out(books: Iterable[models.Book]) -> List[dict]:
+    return [book_out(book) for book in books]
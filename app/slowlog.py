@@ -0,0 +1,180 @@
+# app/slowlog.py
+import logging
+import re
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, List, NamedTuple, Optional
+from . import database
+from .cache import TTLCache
+from .config import settings
+
+# Журнал медленных запросов: вместо echo=True (все запросы подряд) сохраняются только
+# запросы дольше SLOW_QUERY_MS — с формой параметров (типы, без значений), маршрутом
+# и планом выполнения. Записи лежат в кольцевом буфере и видны в /admin/slow-queries.
+
+logger = logging.getLogger("app.slow_query")
+
+# Порог в секундах; None — журнал выключен. Можно менять на лету (тесты)
+threshold: Optional[float] = settings.SLOW_QUERY_MS / 1000 if settings.SLOW_QUERY_MS > 0 else None
+
+# Сколько параметров показывать по одному, дальше — сводка по типам (IN-списки на сотни id)
+MAX_SHAPE_ITEMS = 20
+
+_EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+    "mariadb": "EXPLAIN ",
+}
+_EXPLAINABLE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class SlowQuery(NamedTuple):
+    at: datetime
+    seconds: float
+    route: str
+    statement: str
+    parameters: str
+    plan: List[str]
+
+
+_records: Deque[SlowQuery] = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+# План одного и того же текста запроса не снимаем при каждом повторе
+_plans = TTLCache("slow_query_plans", maxsize=256, ttl=600)
+
+# Scope текущего HTTP-запроса: маршрут в нём появляется только после роутинга, поэтому читается в момент записи
+_current_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_scope", default=None)
+
+
+def _shape(params) -> str:
+    if isinstance(params, dict):
+        values = list(params.values())
+        items = [f"{key}: {type(value).__name__}" for key, value in params.items()]
+        opening, closing = "{", "}"
+    else:
+        values = list(params)
+        items = [type(value).__name__ for value in values]
+        opening, closing = "(", ")"
+    if len(items) > MAX_SHAPE_ITEMS:
+        counts = Counter(type(value).__name__ for value in values)
+        summary = ", ".join(f"{name}×{count}" for name, count in counts.most_common())
+        return f"{opening}{len(items)} params: {summary}{closing}"
+    return opening + ", ".join(items) + closing
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Типы связанных параметров без самих значений (в них могут быть пароли и личные данные)."""
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} × {_shape(rows[0])}" if rows else "[]"
+    return _shape(parameters or ())
+
+
+def _plan_lines(dialect: str, rows) -> List[str]:
+    if dialect == "sqlite":
+        # (id, parent, notused, detail): отступ по вложенности, как в консоли sqlite3
+        depth = {}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+    return [str(row[0]) if len(row) == 1 else " | ".join(map(str, row)) for row in rows]
+
+
+def _run_explain(conn, sql: str, parameters) -> List[str]:
+    dialect = conn.dialect.name
+    # Отдельный курсор DBAPI: результат исходного запроса ещё не прочитан, и события SQLAlchemy не срабатывают
+    cursor = conn.connection.dbapi_connection.cursor()
+    # В PostgreSQL ошибка обрывает транзакцию — EXPLAIN идёт под точкой сохранения
+    savepoint = dialect == "postgresql"
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(sql, parameters)
+            rows = cursor.fetchall()
+        except Exception as exc:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return [f"EXPLAIN failed: {exc}"]
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    return _plan_lines(dialect, rows)
+
+
+def explain(conn, statement: str, parameters, executemany: bool = False) -> List[str]:
+    """EXPLAIN / EXPLAIN QUERY PLAN запроса на том же соединении; пустой список, если бэкенд или запрос не поддерживаются."""
+    dialect = conn.dialect.name
+    prefix = _EXPLAIN_PREFIXES.get(dialect)
+    if prefix is None or not _EXPLAINABLE.match(statement):
+        return []
+    key = (dialect, statement)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _run_explain(conn, prefix + statement, parameters[0] if executemany else parameters)
+        _plans.set(key, plan)
+    return plan
+
+
+def _route() -> str:
+    scope = _current_scope.get()
+    if scope is None:
+        return "-"
+    return f'{scope["method"]} {getattr(scope.get("route"), "path", scope["path"])}'
+
+
+def observe(conn, cursor, statement, parameters, executemany, seconds: float):
+    if threshold is None or seconds < threshold:
+        return
+    record = SlowQuery(
+        at=datetime.now(),
+        seconds=seconds,
+        route=_route(),
+        statement=statement,
+        parameters=parameter_shape(parameters, executemany),
+        plan=explain(conn, statement, parameters, executemany),
+    )
+    with _lock:
+        _records.append(record)
+    logger.warning("Slow query %.1f ms on %s: %s %s plan=%s", seconds * 1000, record.route,
+                   " ".join(statement.split()), record.parameters, " / ".join(line.strip() for line in record.plan))
+
+
+def records() -> List[SlowQuery]:
+    """Записи буфера, новые первыми."""
+    with _lock:
+        return list(reversed(_records))
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+def install():
+    """Подключает журнал к событиям курсора всех движков. Вызывается один раз при старте приложения."""
+    database.instrument_queries()
+    database.query_observer = observe
+
+
+class RequestScopeMiddleware:
+    """ASGI-middleware: делает scope запроса доступным журналу (маршрут медленного запроса)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
@@ -0,0 +1,31 @@
+# app/templating.py
+import os
+from typing import Optional
+import jinja2
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from .config import settings
+
+# Одно окружение шаблонов на всё приложение. Скомпилированный байткод сохраняется
+# на диск, поэтому холодный воркер не разбирает шаблоны заново.
+# FileSystemBytecodeCache сам каталог не создаёт
+if settings.TEMPLATE_CACHE_DIR:
+    os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("templates"),
+    autoescape=True,
+    bytecode_cache=jinja2.FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR),
+)
+templates = Jinja2Templates(env=_env)
+
+
+def stream_template(name: str, context: dict, status_code: int = 200,
+                    headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Отдаёт шаблон по частям (Template.generate): браузер получает начало страницы,
+    пока рендерится остальное. Для длинных списков вместо TemplateResponse.
+    """
+    template = templates.get_template(name)
+    return StreamingResponse(
+        template.generate(context), status_code=status_code, headers=headers, media_type="text/html; charset=utf-8"
+    )
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Бенчмарки запускаются вручную из корня проекта: python -m benchmarks.<модуль>
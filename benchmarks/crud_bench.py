@@ -0,0 +1,90 @@
+# benchmarks/crud_bench.py
+"""Микро-бенчмарки функций app/crud.py на уже заполненном каталоге."""
+import random
+import time
+from typing import Callable, Dict
+from sqlalchemy.orm import Session
+from app import crud, models, schemas
+from app.database import SessionLocal
+from .catalog import generate_books
+from .stats import summarize
+
+
+def _measure(fn: Callable[[int], object], repeat: int) -> Dict[str, float]:
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def _deep_cursor(db: Session, depth: int) -> str:
+    """Курсор на странице около depth-й книги по title — для оценки глубокой пагинации."""
+    title, book_id = (
+        db.query(models.Book.title, models.Book.id).order_by(models.Book.title, models.Book.id)
+        .offset(depth).limit(1).one()
+    )
+    return crud.encode_cursor({"s": "title", "o": "asc", "k": [title, book_id], "d": "next", "p": 2})
+
+
+def run(repeat: int = 200, seed: int = 7) -> Dict[str, dict]:
+    """
+    Каждая функция вызывается repeat раз в свежей сессии на вызов, как в обработчиках.
+    Пишущие бенчмарки создают свои книги и удаляют их, каталог остаётся прежнего размера.
+    """
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        total = crud.count_books(db)
+        max_id = db.query(models.Book.id).order_by(models.Book.id.desc()).limit(1).scalar() or 1
+        deep_cursor = _deep_cursor(db, max(total - 20, 0) * 9 // 10)
+    random_ids = [rng.randint(1, max_id) for _ in range(repeat)]
+    new_books = [
+        schemas.BookCreate(**{**book._asdict(), "title": f"Bench {book.title}"})
+        for book in generate_books(repeat, seed=seed + 1)
+    ]
+
+    def with_session(fn):
+        def call(i):
+            with SessionLocal() as db:
+                return fn(db, i)
+        return call
+
+    created_ids = []
+    benchmarks = {
+        "get_book": lambda db, i: crud.get_book(db, random_ids[i]),
+        "get_book_out": lambda db, i: crud.get_book_out(db, random_ids[i]),
+        "get_books_offset_first_page": lambda db, i: crud.get_books(db, skip=0, limit=20, sort_by="title"),
+        "get_books_offset_deep_page": lambda db, i: crud.get_books(db, skip=max(total - 40, 0) * 9 // 10, limit=20, sort_by="title"),
+        "get_books_page_first": lambda db, i: crud.get_books_page(db, limit=20, sort_by="title"),
+        "get_books_page_deep_cursor": lambda db, i: crud.get_books_page(db, cursor=deep_cursor, limit=20),
+        "get_books_page_filtered": lambda db, i: crud.get_books_page(db, limit=20, title="Shadow", genre="History"),
+        "search_books": lambda db, i: crud.search_books(db, "river empire", limit=20),
+        "count_books": lambda db, i: crud.count_books(db),
+        "get_catalog_version": lambda db, i: crud.get_catalog_version(db),
+        "create_book": lambda db, i: created_ids.append(crud.create_book(db, new_books[i]).id),
+        "update_book": lambda db, i: crud.update_book(db, created_ids[i], schemas.BookUpdate(
+            title=new_books[i].title + " (2nd ed.)", genre=None, published_year=None, authors=new_books[i].authors[:1])),
+        "delete_book": lambda db, i: crud.delete_book(db, created_ids[i]),
+    }
+    results = {name: _measure(with_session(fn), repeat) for name, fn in benchmarks.items()}
+
+    # Пачечные функции: одна итерация обрабатывает много строк
+    batch = max(repeat // 10, 1)
+
+    def bulk_and_cleanup(i):
+        with SessionLocal() as db:
+            books = [schemas.BookCreate(**b._asdict()) for b in generate_books(1000, seed=seed + 100 + i)]
+            crud.bulk_create_books(db, books)
+            ids = [book_id for (book_id,) in db.query(models.Book.id).order_by(models.Book.id.desc()).limit(1000)]
+            crud.batch_books(db, schemas.BookBatch(delete=ids))
+
+    results["bulk_create_books_1000_and_batch_delete"] = _measure(bulk_and_cleanup, batch)
+
+    def full_scan(i):
+        with SessionLocal() as db:
+            for _ in crud.iter_books(db):
+                pass
+
+    results["iter_books_full_scan"] = _measure(full_scan, 1)
+    return results
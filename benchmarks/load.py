@@ -0,0 +1,110 @@
+# benchmarks/load.py
+"""
+Нагрузочный драйвер: конкурентные HTTP-запросы к ASGI-приложению в том же процессе
+(httpx.ASGITransport, без сети). Считает задержки p50/p95/p99 и запросы в секунду.
+"""
+import asyncio
+import csv
+import io
+import random
+import time
+from typing import Callable, Dict, List
+import httpx
+from app import crud, models, schemas
+from app.database import SessionLocal
+from app.main import app, create_root_admin
+from .catalog import generate_books
+from .stats import summarize
+
+
+def _import_csv(rows: int, seed: int) -> bytes:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["title", "genre", "published_year", "authors"])
+    for book in generate_books(rows, seed=seed):
+        writer.writerow([f"Load {book.title}", book.genre, book.published_year, ", ".join(book.authors)])
+    return output.getvalue().encode("utf-8")
+
+
+async def _login(client: httpx.AsyncClient) -> Dict[str, str]:
+    response = await client.post("/api/users/login", data={"username": "root", "password": "123"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _import_and_wait(client: httpx.AsyncClient, headers: Dict[str, str], payload: bytes) -> httpx.Response:
+    """Импорт фоновый: замеряем время до завершения задачи, а не только постановки в очередь."""
+    response = await client.post("/admin/import", headers=headers, files={"file": ("load.csv", payload, "text/csv")})
+    if response.status_code != 302:
+        return response
+    status_url = response.headers["location"] + "/status"
+    while True:
+        status = await client.get(status_url, headers=headers)
+        if status.status_code != 200 or status.json()["status"] in ("done", "failed"):
+            return status
+        await asyncio.sleep(0.05)
+
+
+def scenarios(import_rows: int, seed: int) -> Dict[str, Callable]:
+    """Сценарий — функция (client, headers, rng) -> корутина запроса."""
+    genres = ["Fiction", "Non-Fiction", "Science", "History"]
+    payload = _import_csv(import_rows, seed)
+    return {
+        "read_books": lambda c, h, rng: c.get("/api/books/", params={"limit": 20, "genre": rng.choice(genres)}),
+        "read_books_sorted": lambda c, h, rng: c.get("/api/books/", params={"limit": 20, "sort_by": "title"}),
+        "home": lambda c, h, rng: c.get("/", headers=h),
+        "admin_export_ndjson": lambda c, h, rng: c.get("/admin/export", params={"format": "ndjson"}, headers=h),
+        "admin_import_csv": lambda c, h, rng: _import_and_wait(c, h, payload),
+    }
+
+
+async def _drive(name: str, request: Callable, requests: int, concurrency: int, seed: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers = await _login(client)
+        rng = random.Random(seed)
+        timings: List[float] = []
+        errors = 0
+        remaining = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await request(client, headers, rng)
+                timings.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {**summarize(timings, elapsed), "errors": errors, "concurrency": concurrency}
+
+
+def run(requests: int = 500, concurrency: int = 16, only: List[str] = None,
+        import_rows: int = 1000, seed: int = 11) -> Dict[str, dict]:
+    """
+    Прогоняет сценарии по очереди. Экспорт и импорт тяжёлые, поэтому для них число
+    запросов уменьшено в 50 раз (но не меньше 2).
+    """
+    create_root_admin()
+    results = {}
+    for name, request in scenarios(import_rows, seed).items():
+        if only and name not in only:
+            continue
+        count = requests if not name.startswith("admin_") else max(requests // 50, 2)
+        results[name] = asyncio.run(_drive(name, request, count, concurrency, seed))
+    _remove_imported()
+    return results
+
+
+def _remove_imported(batch: int = 1000):
+    """Удаляет книги сценария импорта, чтобы каталог оставался того же размера между запусками."""
+    with SessionLocal() as db:
+        while True:
+            ids = [book_id for (book_id,) in
+                   db.query(models.Book.id).filter(models.Book.title.startswith("Load ")).limit(batch)]
+            if not ids:
+                return
+            crud.batch_books(db, schemas.BookBatch(delete=ids))
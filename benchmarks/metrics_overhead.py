@@ -0,0 +1,174 @@
+# benchmarks/metrics_overhead.py
+"""
+Накладные расходы инструментирования (METRICS_ENABLED) на горячих путях. Процесс
+стартует с METRICS_ENABLED=false и SLOW_QUERY_MS=0 — без middleware, событий курсора
+и замера пула. Режим «вкл» добавляет ровно то, что даёт METRICS_ENABLED=true:
+MetricsMiddleware, события курсора, класс пула с замером ожидания и наблюдатели.
+
+Отдельные процессы и даже соседние прогоны на одной машине расходятся на 5–20 %,
+больше самого эффекта, поэтому режимы чередуются пачками в одном процессе по схеме
+выкл–вкл–выкл: накладные расходы пачки считаются от среднего двух соседних «выкл»,
+итог — медиана по раундам. Контроль (A/A) — та же тройка без инструментирования в
+середине: её медиана показывает, насколько сравнение ошибается само по себе.
+Сравнивается процессорное время на запрос; req/s приводится для справки.
+
+    python -m benchmarks.metrics_overhead [--books 10000] [--requests 100] [--rounds 100]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import statistics
+import time
+from contextlib import contextmanager, nullcontext
+
+HOT_PATHS = ("read_books", "read_book")
+
+
+def middleware_cost_us(calls: int = 100_000) -> float:
+    """Время MetricsMiddleware на запрос за вычетом пустого ASGI-приложения, мкс."""
+    from app import metrics
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+
+    async def send(message):
+        pass
+
+    async def timed(app) -> float:
+        scope = {"type": "http", "method": "GET"}
+        started = time.perf_counter()
+        for _ in range(calls):
+            await app(scope, None, send)
+        return (time.perf_counter() - started) / calls * 1e6
+
+    cost = asyncio.run(timed(metrics.MetricsMiddleware(endpoint))) - asyncio.run(timed(endpoint))
+    for histogram in metrics.HISTOGRAMS:
+        histogram.clear()
+    return cost
+
+
+@contextmanager
+def instrumented():
+    """Включает в процессе то, что добавляет METRICS_ENABLED=true; на выходе возвращает как было."""
+    from sqlalchemy.pool import QueuePool
+    from app import database, metrics
+    from app.passwords import hasher
+
+    pools = [engine.pool for engine in database.all_engines() if isinstance(engine.pool, QueuePool)]
+    classes = [type(pool) for pool in pools]
+    for pool, base in zip(pools, classes):
+        pool.__class__ = database.timed_pool_class(base)
+    metrics.install()
+    try:
+        yield
+    finally:
+        database.uninstrument_queries()
+        database.pool_wait_observer = None
+        hasher.duration_observer = None
+        for pool, base in zip(pools, classes):
+            pool.__class__ = base
+
+
+async def _measure(client, scenario: str, books: int, requests: int, concurrency: int, rng) -> dict:
+    def request():
+        if scenario == "read_books":
+            return client.get("/api/books/", params={"limit": 20})
+        return client.get(f"/api/books/{rng.randint(1, books)}")
+
+    async def worker(remaining):
+        for _ in remaining:
+            (await request()).raise_for_status()
+
+    remaining = iter(range(requests))
+    # Сборка мусора между пачками, а не внутри: полный проход gc на сотни мкс попадал бы в случайную пачку
+    gc.collect()
+    gc.disable()
+    try:
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.gather(*(worker(remaining) for _ in range(concurrency)))
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    finally:
+        gc.enable()
+    return {"cpu_us_per_request": cpu / requests * 1e6, "per_second": requests / wall}
+
+
+async def compare(scenario: str, books: int, requests: int, rounds: int, concurrency: int) -> dict:
+    """Раунды выкл–вкл–выкл и контрольные выкл–выкл–выкл одного сценария; медианы, %."""
+    import httpx
+    from app import metrics
+    from app.main import app
+
+    rng = random.Random(0)
+    plain = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    with_metrics = httpx.AsyncClient(transport=httpx.ASGITransport(app=metrics.MetricsMiddleware(app)),
+                                     base_url="http://bench")
+
+    async def triple(instrument: bool):
+        before = await _measure(plain, scenario, books, requests, concurrency, rng)
+        with instrumented() if instrument else nullcontext():
+            middle = await _measure(with_metrics if instrument else plain, scenario, books, requests, concurrency, rng)
+        after = await _measure(plain, scenario, books, requests, concurrency, rng)
+        off = (before["cpu_us_per_request"] + after["cpu_us_per_request"]) / 2
+        return (middle["cpu_us_per_request"] - off) / off * 100, [before, after], middle
+
+    overhead, noise, off_runs, on_runs = [], [], [], []
+    async with plain, with_metrics:
+        await _measure(plain, scenario, books, requests, concurrency, rng)  # прогрев: кеши, пул, скомпилированные запросы
+        with instrumented():
+            await _measure(with_metrics, scenario, books, requests, concurrency, rng)
+        for round_number in range(rounds):
+            for instrument in (True, False) if round_number % 2 == 0 else (False, True):
+                percent, off, middle = await triple(instrument)
+                (overhead if instrument else noise).append(percent)
+                off_runs += off
+                if instrument:
+                    on_runs.append(middle)
+    for histogram in metrics.HISTOGRAMS:
+        histogram.clear()
+    return {
+        "baseline_cpu_us_per_request": round(statistics.median(r["cpu_us_per_request"] for r in off_runs), 1),
+        "instrumented_cpu_us_per_request": round(statistics.median(r["cpu_us_per_request"] for r in on_runs), 1),
+        "overhead_percent": round(statistics.median(overhead), 2),
+        # Та же схема без инструментирования в середине: на сколько сравнение ошибается само по себе
+        "noise_percent": round(statistics.median(noise), 2),
+        "baseline_req_per_second": round(statistics.median(r["per_second"] for r in off_runs), 1),
+        "instrumented_req_per_second": round(statistics.median(r["per_second"] for r in on_runs), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=100, help="запросов в пачке")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", help="путь JSON с результатами")
+    args = parser.parse_args()
+
+    # Базовая конфигурация — без инструментирования; режим «вкл» включает его сам (instrumented)
+    os.environ.update(DATABASE_URL=f"sqlite:///./bench_{args.books}.db", METRICS_ENABLED="false",
+                      SLOW_QUERY_MS="0")
+    os.environ.setdefault("ENGINE_PROFILE", "production")
+    from app import main  # noqa: F401 — создаёт таблицы и индексы до засева
+    from app.database import SessionLocal
+    from . import catalog
+    from .stats import save_results
+
+    with SessionLocal() as db:
+        catalog.seed_catalog(db, args.books)
+    cost = middleware_cost_us()
+    print(f"middleware cost {cost:.2f} us/request")
+    results = {"middleware_us_per_request": round(cost, 2)}
+    for scenario in HOT_PATHS:
+        r = results[scenario] = asyncio.run(compare(scenario, args.books, args.requests, args.rounds, args.concurrency))
+        print(f"{scenario:<12} off {r['baseline_cpu_us_per_request']:>8} us  on {r['instrumented_cpu_us_per_request']:>8} us"
+              f"  overhead {r['overhead_percent']:>5} %  (A/A control {r['noise_percent']} %, "
+              f"{r['baseline_req_per_second']} -> {r['instrumented_req_per_second']} req/s)")
+    if args.output:
+        save_results(args.output, results, books=args.books, requests=args.requests, rounds=args.rounds)
+
+
+if __name__ == "__main__":
+    main()
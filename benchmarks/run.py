@@ -0,0 +1,62 @@
+# benchmarks/run.py
+"""
+Набор бенчмарков на синтетическом каталоге:
+
+    python -m benchmarks.run --books 10000                 # засев + crud + HTTP-нагрузка
+    python -m benchmarks.run --books 100000 --skip crud
+    python -m benchmarks.run --books 1000000 --only-seed
+
+База по умолчанию — отдельный SQLite-файл на размер каталога (bench_<books>.db), повторный
+запуск досевает каталог только до нужного размера. Результаты пишутся в JSON
+(benchmarks/results/<books>-<время>.json) для сравнения между релизами.
+"""
+import argparse
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000, help="размер каталога: 10000, 100000, 1000000")
+    parser.add_argument("--database-url", help="по умолчанию sqlite:///./bench_<books>.db")
+    parser.add_argument("--repeat", type=int, default=200, help="вызовов на каждую функцию crud")
+    parser.add_argument("--requests", type=int, default=500, help="HTTP-запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenario", action="append", help="только указанные HTTP-сценарии")
+    parser.add_argument("--skip", action="append", default=[], choices=["crud", "load"])
+    parser.add_argument("--only-seed", action="store_true")
+    parser.add_argument("--output", help="путь JSON с результатами")
+    args = parser.parse_args()
+
+    # Настройки приложения читаются при импорте app, поэтому окружение задаём до него
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///./bench_{args.books}.db"
+    os.environ.setdefault("ENGINE_PROFILE", "production")
+    from app.database import SessionLocal
+    from app.main import app  # noqa: F401 — создаёт таблицы, индексы и счётчики
+    from . import catalog, crud_bench, load
+    from .stats import save_results
+
+    results = {}
+    with SessionLocal() as db:
+        seeded = catalog.seed_catalog(db, args.books)
+    results["seed"] = seeded.dict()
+    print(f"catalog: {args.books} books ({seeded.imported} seeded, {seeded.rows_per_second} rows/s)")
+    if not args.only_seed:
+        if "crud" not in args.skip:
+            results["crud"] = crud_bench.run(repeat=args.repeat)
+            for name, summary in results["crud"].items():
+                print(f"crud {name:<42} p50 {summary['p50_ms']:>9} ms  p95 {summary['p95_ms']:>9} ms")
+        if "load" not in args.skip:
+            results["load"] = load.run(requests=args.requests, concurrency=args.concurrency, only=args.scenario)
+            for name, summary in results["load"].items():
+                print(f"http {name:<24} p50 {summary['p50_ms']:>9} ms  p95 {summary['p95_ms']:>9} ms  "
+                      f"p99 {summary['p99_ms']:>9} ms  {summary['per_second']:>8} req/s  errors {summary['errors']}")
+
+    output = args.output or os.path.join("benchmarks", "results", f"{args.books}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    save_results(output, results, books=args.books, database_url=os.environ["DATABASE_URL"],
+                 concurrency=args.concurrency, repeat=args.repeat, requests=args.requests)
+    print(f"results: {output}")
+
+
+if __name__ == "__main__":
+    main()
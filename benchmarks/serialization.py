@@ -0,0 +1,80 @@
+# benchmarks/serialization.py
+"""
+Сравнение сериализации списка книг: путь FastAPI (response_model=List[BookOut] +
+JSONResponse) против быстрого пути (serializers.books_out + FastJSONResponse).
+
+    python -m benchmarks.serialization [--books 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app import models, schemas, serializers
+
+
+def make_books(count: int, seed: int = 42) -> List[models.Book]:
+    """Несвязанные с сессией ORM-объекты: 1–3 автора на книгу из общего пула."""
+    rng = random.Random(seed)
+    authors = [models.Author(id=i, name=f"Автор {i}") for i in range(1, max(count // 5, 1) + 1)]
+    genres = sorted(schemas.ALLOWED_GENRES)
+    return [
+        models.Book(
+            id=i, title=f"Книга «{i}»", genre=rng.choice(genres), published_year=rng.randint(1800, 2024),
+            authors=rng.sample(authors, rng.randint(1, min(3, len(authors)))),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def pydantic_path(books, field) -> bytes:
+    content = asyncio.run(serialize_response(field=field, response_content=books))
+    return JSONResponse(content).body
+
+
+def fast_path(books) -> bytes:
+    return serializers.FastJSONResponse(serializers.books_out(books)).body
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(count: int, repeat: int) -> dict:
+    books = make_books(count)
+    field = create_model_field(name="Response", type_=List[schemas.BookOut], mode="serialization")
+    baseline_body = pydantic_path(books, field)
+    fast_body = fast_path(books)
+    assert baseline_body == fast_body, "fast path output differs from response_model output"
+    baseline = best_of(lambda: pydantic_path(books, field), repeat)
+    fast = best_of(lambda: fast_path(books), repeat)
+    return {
+        "books": count,
+        "bytes": len(fast_body),
+        "orjson": serializers.orjson is not None,
+        "response_model_seconds": round(baseline, 4),
+        "fast_path_seconds": round(fast, 4),
+        "speedup": round(baseline / fast, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    result = run(args.books, args.repeat)
+    for key, value in result.items():
+        print(f"{key:>24}: {value}")
+
+
+if __name__ == "__main__":
+    main()
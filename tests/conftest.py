@@ -0,0 +1,4 @@
+import os
+
+# Тесты работают на профиле движка "test" (см. app.config.ENGINE_PROFILES)
+os.environ.setdefault("ENGINE_PROFILE", "test")
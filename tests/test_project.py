@@ -1,11 +1,20 @@
 # tests/test_project.py
 import os
+import io
+import asyncio
 import json
+import threading
+import time
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config import Settings, settings
 from app.database import SessionLocal
-from app import crud, schemas
+from app import acrud, auth, crud, database, importer, models, schemas, search
+from app.cache import CACHES, KeyValueCache, LocalKeyValueStore, TTLCache, token_cache, user_cache
+from app.passwords import HasherOverloaded, PasswordHasher
 
 client = TestClient(app)
 
@@ -18,6 +27,18 @@ def admin_token():
     token = response.json()["access_token"]
     return token
 
+def wait_for_import(response, headers, timeout=10.0):
+    """Импорт идёт в фоне: ждём, пока задача из редиректа завершится, и возвращаем её состояние."""
+    assert response.status_code == 302, response.text
+    location = response.headers["location"]
+    assert location.startswith("/admin/import/")
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(location + "/status", headers=headers).json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
 def test_import_csv(admin_token):
     headers = {"Authorization": f"Bearer {admin_token}"}
     csv_file_path = os.path.join(os.path.dirname(__file__), "sample_books.csv")
@@ -26,6 +47,7 @@ def test_import_csv(admin_token):
         # Используем follow_redirects=False для проверки статуса редиректа
         response = client.post("/admin/import", files=files, headers=headers, follow_redirects=False)
     assert response.status_code == 302, f"CSV import failed: {response.text}"
+    assert wait_for_import(response, headers)["status"] == "done"
     
     # Проверяем экспорт в JSON для подтверждения импорта
     response_export = client.get("/admin/export?format=json", headers=headers)
@@ -42,6 +64,7 @@ def test_import_json(admin_token):
         files = {"file": ("sample_books.json", f, "application/json")}
         response = client.post("/admin/import", files=files, headers=headers, follow_redirects=False)
     assert response.status_code == 302, f"JSON import failed: {response.text}"
+    assert wait_for_import(response, headers)["status"] == "done"
     
     response_export = client.get("/admin/export?format=json", headers=headers)
     assert response_export.status_code == 200, f"Export failed: {response_export.text}"
@@ -153,3 +176,645 @@ def test_admin_panel_access():
     headers = {"Authorization": f"Bearer {admin_token}"}
     response = client.get("/admin/", headers=headers)
     assert response.status_code == 200, response.text
+
+def test_bulk_create_books_chunks_and_shares_authors(db):
+    books = [
+        schemas.BookCreate(title=f"Bulk Book {i}", genre="History", published_year=1990 + i,
+                           authors=["Bulk Author", f"Bulk Author {i % 2}"])
+        for i in range(5)
+    ]
+    stats = crud.bulk_create_books(db, books, chunk_size=2)
+    assert stats.imported == 5
+    assert stats.rows_per_second > 0
+    # Общий автор создан один раз и привязан ко всем книгам
+    shared = db.query(models.Author).filter(models.Author.name == "Bulk Author").one()
+    assert {b.title for b in shared.books} >= {f"Bulk Book {i}" for i in range(5)}
+
+def test_iter_json_array_streams_across_chunk_boundaries():
+    items = [{"title": f"Книга {i}", "published_year": 2000 + i} for i in range(20)]
+    raw = json.dumps(items, ensure_ascii=False).encode("utf-8")
+    # Маленькие блоки режут и объекты, и многобайтовые символы UTF-8
+    for chunk_size in (1, 3, 64):
+        assert list(importer.iter_json_array(io.BytesIO(raw), chunk_size=chunk_size)) == items
+    with pytest.raises(ValueError):
+        list(importer.iter_json_array(io.BytesIO(b'[{"title": "x"} {"title": "y"}]')))
+
+def test_export_ndjson_and_csv_stream_all_books(admin_token, db):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    total = crud.count_books(db)
+    response = client.get("/admin/export?format=ndjson", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert len(lines) == total
+    assert all("authors" in json.loads(line) for line in lines)
+
+    response = client.get("/admin/export?format=csv", headers=headers)
+    assert response.status_code == 200, response.text
+    assert len(response.text.strip().splitlines()) == total + 1
+
+def test_book_list_query_count_is_constant():
+    # Страница из N книг стоит фиксированное число запросов: версия каталога (ETag) + книги + один SELECT авторов
+    small = client.get("/api/books/?limit=1")
+    large = client.get("/api/books/?limit=5")
+    assert small.status_code == 200 and large.status_code == 200
+    assert len(large.json()) == 5
+    assert small.headers["X-Query-Count"] == large.headers["X-Query-Count"] == "3"
+
+def test_read_books_filters(db):
+    crud.create_book(db, schemas.BookCreate(title="Filter Target 50%", genre="Science",
+                                            published_year=1950, authors=["Filter Author"]))
+    response = client.get("/api/books/", params={"title": "filter target 50%", "genre": "Science",
+                                                 "author": "filter auth", "year_from": 1949, "year_to": 1951})
+    assert response.status_code == 200, response.text
+    assert [b["title"] for b in response.json()] == ["Filter Target 50%"]
+    # Фильтры сужают выборку: неподходящий жанр и диапазон лет ничего не возвращают
+    assert client.get("/api/books/", params={"title": "Filter Target", "genre": "History"}).json() == []
+    assert client.get("/api/books/", params={"title": "Filter Target", "year_from": 1951}).json() == []
+
+def test_cursor_pagination_walks_forward_and_back():
+    params = {"limit": 3, "sort_by": "title", "order": "desc"}
+    first = client.get("/api/books/", params=params)
+    assert first.status_code == 200, first.text
+    second = client.get("/api/books/", params={"limit": 3, "cursor": first.headers["X-Next-Cursor"]})
+    assert second.status_code == 200, second.text
+    first_ids = [b["id"] for b in first.json()]
+    second_ids = [b["id"] for b in second.json()]
+    assert second_ids and not set(first_ids) & set(second_ids)
+    titles = [b["title"] for b in first.json() + second.json()]
+    assert titles == sorted(titles, reverse=True)
+    # Курсор «назад» со второй страницы возвращает ровно первую
+    back = client.get("/api/books/", params={"limit": 3, "cursor": second.headers["X-Prev-Cursor"]})
+    assert [b["id"] for b in back.json()] == first_ids
+    assert client.get("/api/books/", params={"cursor": "garbage"}).status_code == 400
+
+def test_book_counter_tracks_writes(db):
+    assert crud.count_books(db) == db.query(models.Book).count()
+    before = crud.count_books(db)
+    book = crud.create_book(db, schemas.BookCreate(title="Counted", genre="History",
+                                                   published_year=2001, authors=["Counter Author"]))
+    crud.bulk_create_books(db, [schemas.BookCreate(title="Counted Bulk", genre="History",
+                                                   published_year=2001, authors=["Counter Author"])] * 3)
+    assert crud.count_books(db) == before + 4
+    crud.delete_book(db, book.id)
+    assert crud.count_books(db) == before + 3 == db.query(models.Book).count()
+
+def test_search_books_by_title_and_author(db):
+    book = crud.create_book(db, schemas.BookCreate(title="Zephyrine Chronicles", genre="Fiction",
+                                                   published_year=1999, authors=["Quillon Marsh"]))
+    by_title = client.get("/api/books/search", params={"q": "zephyr"})
+    assert by_title.status_code == 200, by_title.text
+    assert [b["id"] for b in by_title.json()] == [book.id]
+    assert [b["id"] for b in client.get("/api/books/search", params={"q": "quillon"}).json()] == [book.id]
+    # Индекс следует за изменениями и удалением
+    crud.update_book(db, book.id, schemas.BookUpdate(title="Renamed Chronicles", genre="Fiction",
+                                                     published_year=1999, authors=["Quillon Marsh"]))
+    assert client.get("/api/books/search", params={"q": "zephyrine"}).json() == []
+    crud.delete_book(db, book.id)
+    assert client.get("/api/books/search", params={"q": "renamed chronicles"}).json() == []
+
+def test_acrud_on_async_session():
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async def scenario():
+        engine = create_async_engine(database.async_database_url(settings.DATABASE_URL))
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            book = await acrud.create_book(session, schemas.BookCreate(
+                title="Async Book", genre="Science", published_year=2011, authors=["Async Author"]))
+            fetched = await acrud.get_book(session, book.id)
+            # Авторы уже загружены: обращение вне greenlet не делает IO
+            assert [a.name for a in fetched.authors] == ["Async Author"]
+            assert await acrud.delete_book(session, book.id) is not None
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_engine_profile_pragmas_and_overrides():
+    # conftest выбирает профиль "test": synchronous=OFF
+    with database.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 0
+    profile = Settings(ENGINE_PROFILE="production", DB_POOL_SIZE=3, DB_ECHO=True).engine_profile()
+    assert profile["pool_size"] == 3
+    assert profile["echo"] is True
+    assert profile["sqlite_pragmas"]["journal_mode"] == "WAL"
+    with pytest.raises(ValueError):
+        Settings(ENGINE_PROFILE="unknown").engine_profile()
+
+def test_read_router_uses_replica_unless_client_just_wrote(tmp_path, monkeypatch):
+    # Две локальные SQLite-базы: primary и «реплика» с книгой, которой нет на primary
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    models.Base.metadata.create_all(bind=replica_engine)
+    search.ensure_index(replica_engine)
+    ReplicaSession = sessionmaker(bind=replica_engine)
+    with ReplicaSession() as replica_db:
+        crud.create_book(replica_db, schemas.BookCreate(title="Replica Only", genre="History",
+                                                        published_year=1900, authors=["Replica Author"]))
+    router = database.ReadRouter(database.SessionLocal, [ReplicaSession])
+    monkeypatch.setattr(database, "read_router", router)
+    monkeypatch.setattr(database, "async_read_router", None)
+
+    params = {"title": "Replica Only"}
+    assert [b["title"] for b in client.get("/api/books/", params=params).json()] == ["Replica Only"]
+    # Свежая запись: cookie read-your-writes направляет чтение на primary
+    fresh = {database.PRIMARY_COOKIE: str(time.time() + 5)}
+    assert client.get("/api/books/", params=params, cookies=fresh).json() == []
+    replica_engine.dispose()
+
+def test_current_user_cache_skips_db_lookup(admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    user_cache.clear()
+    first = client.get("/admin/cache-stats", headers=headers)
+    second = client.get("/admin/cache-stats", headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert first.headers["X-Query-Count"] == "1"
+    assert second.headers["X-Query-Count"] == "0"
+    assert second.json()["users"]["hits"] >= 1
+    # Создание пользователя сбрасывает его запись в кеше
+    user_cache.set("cache_user", "stale")
+    client.post("/api/users/register", json={"username": "cache_user", "password": "secret"})
+    assert user_cache.get("cache_user") is None
+
+def test_password_hasher_limits_queue():
+    limited = PasswordHasher(max_workers=1, max_queue=1)
+    hashed = limited.hash_sync("secret")
+    assert asyncio.run(limited.verify("secret", hashed)) is True
+    assert limited.stats()["completed"] == 2
+    # Единственный поток занят, ещё одна задача ждёт — следующая отклоняется
+    gate = threading.Event()
+    try:
+        limited._submit(gate.wait)
+        while limited.stats()["active"] == 0:
+            time.sleep(0.01)
+        limited._submit(gate.wait)
+        with pytest.raises(HasherOverloaded):
+            limited._submit(gate.wait)
+    finally:
+        gate.set()
+    assert limited.stats()["rejected"] == 1
+
+def test_password_hasher_releases_cancelled_slot(admin_token):
+    limited = PasswordHasher(max_workers=1, max_queue=1)
+    gate = threading.Event()
+
+    async def scenario():
+        busy = limited._submit(gate.wait)
+        while limited.stats()["active"] == 0:
+            await asyncio.sleep(0.01)
+        pending = asyncio.ensure_future(limited.verify("secret", "hash"))
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.wrap_future(busy)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        gate.set()
+    # Отменённая задача не держит место в очереди
+    assert limited.stats()["queued"] == 0
+    response = client.get("/admin/hasher-stats", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200 and "queued" in response.json()
+
+def test_import_json_rejects_invalid_items(admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = json.dumps([
+        {"title": "JSON Valid Row", "genre": "History", "published_year": 2000, "authors": ["A"]},
+        {"title": "JSON Bad Genre", "genre": "Cooking", "published_year": 2000, "authors": ["A"]},
+        {"genre": "History"},
+    ]).encode()
+    files = {"file": ("rows.json", payload, "application/json")}
+    job = wait_for_import(client.post("/admin/import", files=files, headers=headers, follow_redirects=False), headers)
+    assert (job["status"], job["imported"], job["rejected"]) == ("done", 1, 2)
+    broken = {"file": ("broken.json", b'[{"title": ', "application/json")}
+    job = wait_for_import(client.post("/admin/import", files=broken, headers=headers, follow_redirects=False), headers)
+    assert job["status"] == "failed" and job["error"].startswith("Invalid JSON file")
+    unsupported = {"file": ("books.xml", b"<books/>", "application/xml")}
+    assert client.post("/admin/import", files=unsupported, headers=headers).status_code == 400
+
+def test_query_count_header_only_in_test_profile():
+    assert Settings(ENGINE_PROFILE="test").engine_profile()["query_count_header"] is True
+    assert Settings(ENGINE_PROFILE="production").engine_profile()["query_count_header"] is False
+
+def test_title_prefix_filter_uses_index(db):
+    query = crud._filter_books(db.query(models.Book.id), title="Filter")
+    sql = str(query.statement.compile(dialect=database.engine.dialect, compile_kwargs={"literal_binds": True}))
+    with database.engine.connect() as conn:
+        plan = " ".join(str(row) for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+    assert "ix_books_title_lower" in plan
+
+def test_cursor_rejects_bad_value_types(admin_token):
+    bad_payloads = [
+        {"d": "next", "k": [{}]},
+        {"d": "next", "k": [True]},
+        {"d": "next", "k": [None]},
+        {"d": "next", "k": [1], "p": "zz"},
+        {"d": "next", "k": [1], "p": 0},
+        {"d": "next", "k": [1], "s": "id"},
+        {"d": "next", "k": [1], "o": "sideways"},
+        {"d": "next", "k": ["a", 1], "s": "title", "o": ["asc"]},
+        {"d": "next", "k": [1, 1], "s": "title"},
+        {"d": "next", "k": ["a", "b"], "s": "title"},
+    ]
+    for payload in bad_payloads:
+        cursor = crud.encode_cursor(payload)
+        with pytest.raises(ValueError):
+            crud.decode_cursor(cursor)
+        response = client.get(f"/api/books/?cursor={cursor}")
+        assert response.status_code == 400, payload
+        response = client.get(f"/?cursor={cursor}", follow_redirects=False)
+        assert response.status_code == 302, payload
+
+    data = crud.decode_cursor(crud.encode_cursor({"d": "prev", "k": ["Title", 5], "s": "title", "p": 3}))
+    assert data == {"s": "title", "o": "asc", "k": ["Title", 5], "d": "prev", "p": 3}
+
+def test_book_counter_seeded_once_and_read_path_never_writes(db):
+    db.query(models.CatalogCounter).filter(models.CatalogCounter.name == crud.BOOK_COUNT).delete()
+    db.commit()
+    total = db.query(models.Book).count()
+    assert crud.count_books(db) == total
+    assert db.get(models.CatalogCounter, crud.BOOK_COUNT) is None
+
+    crud.seed_counters(db)
+    crud.seed_counters(db)
+    db.expire_all()
+    assert db.get(models.CatalogCounter, crud.BOOK_COUNT).value == total
+    assert crud.count_books(db) == total
+
+def test_verified_token_cache(monkeypatch):
+    token_cache.clear()
+    token = auth.create_access_token({"sub": "root"})
+    assert auth.verify_token(token) == "root"
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("signature verified again")
+    monkeypatch.setattr(auth.jwt, "decode", fail_decode)
+    hits = token_cache.stats()["hits"]
+    assert auth.verify_token(token) == "root"
+    assert token_cache.stats()["hits"] == hits + 1
+    monkeypatch.undo()
+
+    # После смены ключа закешированный токен не принимается
+    monkeypatch.setattr(settings, "SECRET_KEY", "rotated")
+    assert auth.verify_token(token) is None
+    assert auth.verify_token(token + "x") is None
+
+def test_book_endpoints_conditional_get(admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    created = client.post("/api/books/", json={
+        "title": "ETag Book", "genre": "Fiction", "published_year": 2001, "authors": ["ETag Author"]
+    }, headers=headers).json()
+    for url in ("/api/books/?limit=5", f"/api/books/{created['id']}", "/admin/export?format=ndjson"):
+        first = client.get(url, headers=headers)
+        etag = first.headers["ETag"]
+        cached = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert cached.status_code == 304 and cached.headers["ETag"] == etag and not cached.content
+        if url.startswith("/api/"):
+            assert cached.headers["X-Query-Count"] == "1"
+        assert client.get(url, headers={**headers, "If-None-Match": '"0-stale"'}).status_code == 200
+
+    # Любая запись меняет версию каталога, и старый ETag больше не совпадает
+    etag = client.get(f"/api/books/{created['id']}").headers["ETag"]
+    client.put(f"/api/books/{created['id']}", json={
+        "title": "ETag Book 2", "genre": "Fiction", "published_year": 2001, "authors": ["ETag Author"]
+    }, headers=headers)
+    response = client.get(f"/api/books/{created['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["title"] == "ETag Book 2"
+    assert response.headers["ETag"] != etag
+
+@pytest.mark.parametrize("backend", ["memory", "kv"])
+def test_book_detail_read_through_cache(admin_token, db, monkeypatch, backend):
+    if backend == "kv":
+        book_cache = KeyValueCache("books-kv-test", LocalKeyValueStore(), ttl=60)
+    else:
+        book_cache = TTLCache("books-memory-test", maxsize=16, ttl=60)
+    monkeypatch.setattr(crud, "book_cache", book_cache)
+    monkeypatch.delitem(CACHES, book_cache.name)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = {"title": f"Cached {backend}", "genre": "Fiction", "published_year": 2003, "authors": [f"Cache Author {backend}"]}
+    book_id = client.post("/api/books/", json=book, headers=headers).json()["id"]
+
+    first = client.get(f"/api/books/{book_id}")
+    second = client.get(f"/api/books/{book_id}")
+    assert first.json() == second.json()
+    # Попадание в кеш: только чтение версии каталога для ETag
+    assert second.headers["X-Query-Count"] == "1"
+
+    # Переименование автора меняет встроенный список авторов книги
+    author = db.query(models.Author).filter(models.Author.name == f"Cache Author {backend}").one()
+    author.name = f"Renamed Author {backend}"
+    db.commit()
+    assert client.get(f"/api/books/{book_id}").json()["authors"][0]["name"] == f"Renamed Author {backend}"
+
+    client.put(f"/api/books/{book_id}", json={**book, "title": f"Cached {backend} v2"}, headers=headers)
+    assert client.get(f"/api/books/{book_id}").json()["title"] == f"Cached {backend} v2"
+    client.delete(f"/api/books/{book_id}", headers=headers)
+    assert client.get(f"/api/books/{book_id}").status_code == 404
+
+def test_books_batch_endpoint(admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    existing = client.post("/api/books/", json={
+        "title": "Batch Old", "genre": "Fiction", "published_year": 1999, "authors": ["Batch Author A"]
+    }, headers=headers).json()
+    doomed = client.post("/api/books/", json={
+        "title": "Batch Doomed", "genre": "Fiction", "published_year": 1999, "authors": ["Batch Author A"]
+    }, headers=headers).json()
+    with SessionLocal() as session:
+        total = crud.count_books(session)
+
+    response = client.post("/api/books/batch", json={
+        "create": [
+            {"title": f"Batch New {i}", "genre": "Science", "published_year": 2010, "authors": ["Batch Author A", "Batch Author B"]}
+            for i in range(3)
+        ],
+        "update": [
+            {"id": existing["id"], "title": "Batch Old v2", "genre": None, "published_year": None, "authors": ["Batch Author B"]},
+            {"id": 10 ** 9, "title": "Missing", "genre": None, "published_year": None, "authors": None},
+        ],
+        "delete": [doomed["id"], 10 ** 9],
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [(r["op"], r["status"]) for r in results] == [
+        ("create", 201), ("create", 201), ("create", 201), ("update", 200), ("update", 404), ("delete", 200), ("delete", 404)
+    ]
+    assert sorted(a["name"] for a in results[0]["book"]["authors"]) == ["Batch Author A", "Batch Author B"]
+    assert results[3]["book"]["title"] == "Batch Old v2"
+    assert [a["name"] for a in results[3]["book"]["authors"]] == ["Batch Author B"]
+    assert client.get(f"/api/books/{doomed['id']}").status_code == 404
+    assert client.get(f"/api/books/{results[0]['id']}").json()["title"] == "Batch New 0"
+    with SessionLocal() as session:
+        assert crud.count_books(session) == total + 2 == session.query(models.Book).count()
+
+    too_big = {"delete": list(range(settings.BOOK_BATCH_MAX_ITEMS + 1))}
+    assert client.post("/api/books/batch", json=too_big, headers=headers).status_code == 413
+
+def test_create_book_resolves_authors_in_one_commit(db):
+    from sqlalchemy import event
+    commits = []
+    listener = lambda session: commits.append(session)
+    event.listen(db, "after_commit", listener)
+    try:
+        names = [f"Set Author {i}" for i in range(5)]
+        with database.count_queries() as single:
+            crud.create_book(db, schemas.BookCreate(
+                title="Set-based Author", genre="Fiction", published_year=2015, authors=["Set Author Solo"]))
+        commits.clear()
+        with database.count_queries() as counter:
+            book = crud.create_book(db, schemas.BookCreate(
+                title="Set-based Authors", genre="Fiction", published_year=2015, authors=names + names[:1]))
+        assert sorted(a.name for a in book.authors) == names
+        assert len(commits) == 1
+        # Не зависит от числа авторов: поиск, upsert, перечитывание новых, затем запись книги
+        assert counter.count == single.count
+
+        # Имя, которое параллельно вставил другой писатель, не ломает upsert
+        crud._insert_missing_authors(db, ["Set Author 0", "Set Author 5"])
+        updated = crud.update_book(db, book.id, schemas.BookUpdate(
+            title=None, genre=None, published_year=None, authors=["Set Author 5", "Set Author 0"]))
+        assert sorted(a.name for a in updated.authors) == ["Set Author 0", "Set Author 5"]
+        assert len(commits) == 2
+    finally:
+        event.remove(db, "after_commit", listener)
+
+def test_list_pages_stream_from_shared_templates(admin_token):
+    import jinja2
+    from app import templating
+    from app.endpoints import admin as admin_endpoints, web as web_endpoints
+    assert web_endpoints.templates is admin_endpoints.templates is templating.templates
+    assert isinstance(templating.templates.env.bytecode_cache, jinja2.FileSystemBytecodeCache)
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = client.post("/api/books/", json={
+        "title": "Streamed <Title>", "genre": "Fiction", "published_year": 2004, "authors": ["Stream Author"]
+    }, headers=headers).json()
+    for url in ("/admin/", "/?sort_by=title&order=desc"):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        # Тело отдаётся частями, без заранее известной длины
+        assert "content-length" not in response.headers
+    assert "Streamed &lt;Title&gt;" in client.get("/admin/", headers=headers).text
+    client.delete(f"/api/books/{book['id']}", headers=headers)
+
+def test_fast_book_serializers_match_pydantic(db):
+    from fastapi.responses import JSONResponse
+    from app import serializers
+    book = crud.create_book(db, schemas.BookCreate(
+        title="Сериализация \"fast\" ✓", genre="History", published_year=1990, authors=["Автор Один", "Author Two"]))
+    books = [book] + crud.get_books(db, limit=20)
+    expected = JSONResponse([schemas.BookOut.from_orm(b).dict() for b in books]).body
+    assert serializers.FastJSONResponse(serializers.books_out(books)).body == expected
+
+    response = client.get("/api/books/", params={"title": "Сериализация"})
+    assert response.content == JSONResponse([schemas.BookOut.from_orm(book).dict()]).body
+    assert response.headers["ETag"] and response.headers["content-type"] == "application/json"
+
+def test_import_batch_validator_reports_rows():
+    report = importer.ImportReport(max_errors=3)
+    rows = [
+        {"title": "Good", "genre": "Science", "published_year": "1999", "authors": "A, B"},
+        {"title": "  ", "genre": "Science", "published_year": "1999", "authors": "A"},
+        {"title": "Bad Genre", "genre": "Cooking", "published_year": "1999", "authors": "A"},
+        {"title": "Bad Year", "genre": "History", "published_year": "soon", "authors": "A"},
+        {"title": "Future", "genre": "History", "published_year": "3000", "authors": "A"},
+        {"title": "No Authors Column", "genre": "History", "published_year": "2000"},
+    ]
+    books = list(importer.iter_valid_books(rows, report, importer.csv_authors, chunk_size=4))
+    assert [(b.title, b.published_year, b.authors) for b in books] == [("Good", 1999, ["A", "B"])]
+    assert report.rejected == 5
+    assert [(e.row, e.field) for e in report.errors] == [(2, "title"), (3, "genre"), (4, "published_year")]
+
+    report = importer.ImportReport()
+    items = [
+        {"title": "Exported", "genre": "Fiction", "published_year": 2001, "authors": [{"name": "X", "id": 1}]},
+        {"title": "Blank Author", "genre": "Fiction", "published_year": 2001, "authors": ["X", " "]},
+        {"title": "Bool Year", "genre": "Fiction", "published_year": True, "authors": ["X"]},
+        "not an object",
+    ]
+    books = importer.validate_books(items, 1, report, importer.json_authors)
+    assert [b.authors for b in books] == [["X"]]
+    assert [(e.row, e.field) for e in report.errors] == [(2, "authors"), (3, "published_year"), (4, "row")]
+
+def test_benchmark_catalog_generator_and_stats():
+    from benchmarks import catalog, stats
+    books = list(catalog.generate_books(2000, seed=1))
+    assert books == list(catalog.generate_books(2000, seed=1))
+    assert all(1 <= len(b.authors) <= 4 and b.genre in schemas.ALLOWED_GENRES for b in books)
+    fan_out = {}
+    for book in books:
+        for name in book.authors:
+            fan_out[name] = fan_out.get(name, 0) + 1
+    # Ципф: самый популярный автор встречается намного чаще медианного
+    counts = sorted(fan_out.values())
+    assert counts[-1] >= 20 * counts[len(counts) // 2]
+
+    summary = stats.summarize([i / 1000 for i in range(1, 101)], elapsed=2.0)
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert summary["per_second"] == 50.0
+
+def test_metrics_endpoint(admin_token):
+    from app import metrics
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.get("/api/books/?limit=3").status_code == 200
+    book_id = client.get("/api/books/?limit=1").json()[0]["id"]
+    client.get(f"/api/books/{book_id}")
+    client.post("/api/users/login", data={"username": "root", "password": "123"})
+    client.get("/admin/cache-stats", headers=headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    # Метки — шаблоны маршрутов, а не конкретные пути
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/books/{book_id}",status="200"}' in text
+    assert f"/api/books/{book_id}\"" not in text
+    assert 'http_request_db_queries_bucket{route="/api/books/",le="+Inf"}' in text
+    assert 'http_request_db_seconds_sum{route="/api/books/"}' in text
+    assert 'db_pool_checkout_wait_seconds_count{engine="primary"}' in text
+    assert "password_hash_duration_seconds_count " in text
+    assert 'cache_hit_ratio{cache="tokens"}' in text and 'cache_hits_total{cache="users"}' in text
+
+    histogram = metrics.Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "/x")
+    assert histogram.collect()[2:] == [
+        'test_seconds_bucket{route="/x",le="0.1"} 2',
+        'test_seconds_bucket{route="/x",le="1.0"} 3',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/x"} 2.65',
+        'test_seconds_count{route="/x"} 4',
+    ]
+
+def test_query_instrumentation_only_when_needed(monkeypatch):
+    from sqlalchemy import event, text
+    # Замер ожидания пула — только с метриками
+    url = "sqlite:///./pool_options.db"
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    assert "poolclass" not in database.engine_options(url, settings.engine_profile())
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    assert database.engine_options(url, settings.engine_profile())["poolclass"].__name__ == "TimedQueuePool"
+
+    # Без instrument_queries запросы не проходят через события курсора и не считаются
+    database.uninstrument_queries()
+    try:
+        assert not event.contains(database.engine, "after_cursor_execute", database._time_query)
+        with database.count_queries() as counter, SessionLocal() as session:
+            session.execute(text("SELECT 1"))
+        assert counter.count == 0
+    finally:
+        database.instrument_queries()
+    with database.count_queries() as counter, SessionLocal() as session:
+        session.execute(text("SELECT 1"))
+    assert counter.count == 1 and counter.seconds > 0
+
+def test_slow_query_log(admin_token, monkeypatch):
+    from app import slowlog
+    monkeypatch.setattr(slowlog, "threshold", 0.0)  # в журнал попадает каждый запрос
+    slowlog.clear()
+    assert client.get("/api/books/", params={"title": "Secret prefix", "limit": 5}).status_code == 200
+    monkeypatch.setattr(slowlog, "threshold", None)
+
+    records = [r for r in slowlog.records() if r.route == "GET /api/books/" and "FROM books" in r.statement]
+    assert records
+    record = records[0]
+    # Форма параметров без значений, план снят на том же соединении
+    assert "Secret" not in record.parameters and "str" in record.parameters
+    assert record.plan and any("books" in line for line in record.plan)
+
+    assert slowlog.parameter_shape(tuple(range(100)) + ("x",)) == "(101 params: int×100, str×1)"
+    assert slowlog.parameter_shape([{"a": 1}, {"a": 2}], executemany=True) == "2 × {a: int}"
+
+    response = client.get("/admin/slow-queries", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert "GET /api/books/" in response.text and "ix_books_title_lower" in response.text
+    assert client.get("/admin/slow-queries").status_code in (401, 403)
+
+def test_import_job_progress_and_resume(admin_token, db):
+    from app import jobs
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    rows = "\n".join(f"Job Book {i},Science,2001,Job Author" for i in range(5))
+    payload = ("title,genre,published_year,authors\n" + rows + "\nBad Job Row,Cooking,2001,Job Author\n").encode()
+    response = client.post("/admin/import", files={"file": ("jobs.csv", payload, "text/csv")},
+                           headers=headers, follow_redirects=False)
+    job = wait_for_import(response, headers)
+    assert (job["status"], job["processed"], job["imported"], job["rejected"]) == ("done", 6, 5, 1)
+    assert job["progress"] == 1.0 and job["eta_seconds"] is None
+    assert job["errors"] == [{"row": 6, "field": "genre", "message": job["errors"][0]["message"]}]
+    page = client.get(response.headers["location"], headers=headers)
+    assert page.status_code == 200 and "Imported 5 books (1 rejected)" in page.text
+    assert client.get("/admin/import/999999/status", headers=headers).status_code == 404
+
+    # Задача, прерванная перезапуском после первых двух строк: продолжается с третьей
+    job = jobs.create_job(db, "resume.csv", io.BytesIO(
+        ("title,genre,published_year,authors\n"
+         + "\n".join(f"Resume Book {i},History,1999,Resume Author" for i in range(4)) + "\n").encode()))
+    job.status, job.processed, job.imported = jobs.RUNNING, 2, 2
+    db.commit()
+    for future in jobs.workers.resume():
+        future.result(timeout=10)
+    db.refresh(job)
+    assert (job.status, job.processed, job.imported) == (jobs.DONE, 4, 2 + 2)
+    titles = {book.title for book in crud.get_books(db, title="Resume Book", limit=10)}
+    assert titles == {"Resume Book 2", "Resume Book 3"}
+    assert not os.path.exists(job.path)
+
+def test_search_index_batches_ids(db, monkeypatch):
+    monkeypatch.setattr(search, "ID_BATCH", 2)
+    books = [importer.ImportedBook(f"Zanzibar Atlas {i}", "Science", 2001, ["Batch Indexer"]) for i in range(5)]
+    crud.bulk_create_books(db, books)
+    found = search.search_book_ids(db, "Zanzibar Atlas", limit=10)
+    assert len(found) == 5
+    search.remove_books(db, found)
+    db.commit()
+    assert search.search_book_ids(db, "Zanzibar Atlas", limit=10) == []
+
+def test_book_cache_filled_only_from_primary(admin_token, tmp_path, monkeypatch):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = {"title": "Lagging v1", "genre": "Fiction", "published_year": 2004, "authors": ["Lag Author"]}
+    book_id = client.post("/api/books/", json=book, headers=headers).json()["id"]
+    # «Реплика» отстала: на ней ещё старая версия книги с тем же id
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'lagging.db'}")
+    models.Base.metadata.create_all(bind=replica_engine)
+    with replica_engine.begin() as conn:
+        conn.execute(models.Book.__table__.insert(), {"id": book_id, "title": "Lagging v0",
+                                                     "genre": "Fiction", "published_year": 2004})
+    monkeypatch.setattr(database, "read_router", database.ReadRouter(database.SessionLocal, [sessionmaker(bind=replica_engine)]))
+    monkeypatch.setattr(database, "async_read_router", None)
+    book_cache = TTLCache("books-replica-test", maxsize=16, ttl=60)
+    monkeypatch.setattr(crud, "book_cache", book_cache)
+    monkeypatch.delitem(CACHES, book_cache.name)
+
+    assert client.get(f"/api/books/{book_id}").json()["title"] == "Lagging v0"
+    assert book_cache.get(book_id) is None
+    fresh = {database.PRIMARY_COOKIE: str(time.time() + 5)}
+    assert client.get(f"/api/books/{book_id}", cookies=fresh).json()["title"] == "Lagging v1"
+    # Заполненная с primary запись отдаётся и читателям реплики
+    assert client.get(f"/api/books/{book_id}").json()["title"] == "Lagging v1"
+    replica_engine.dispose()
+
+def test_import_job_lease_protects_live_jobs(db):
+    from datetime import datetime, timedelta
+    from app import jobs
+    csv_rows = "title,genre,published_year,authors\n" + "\n".join(
+        f"Lease Book {i},History,1999,Lease Author" for i in range(3)) + "\n"
+    job = jobs.create_job(db, "lease.csv", io.BytesIO(csv_rows.encode()))
+    # Задачу выполняет живой воркер другого процесса: resume её не забирает
+    job.status, job.owner, job.heartbeat_at = jobs.RUNNING, "other-host:1:abc", datetime.utcnow()
+    db.commit()
+    for future in jobs.workers.resume():
+        future.result(timeout=10)
+    db.refresh(job)
+    assert (job.status, job.owner, job.imported) == (jobs.RUNNING, "other-host:1:abc", 0)
+
+    # Воркер, у которого задачу забрали, не может продлить аренду и прекращает импорт
+    with pytest.raises(jobs.LeaseLost):
+        jobs._renew_lease(db, job.id)
+    db.rollback()
+
+    # Аренда просрочена — владелец пропал: задачу забирает этот процесс и доводит до конца
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=jobs.workers.lease_seconds + 1)
+    db.commit()
+    for future in jobs.workers.resume():
+        future.result(timeout=10)
+    db.refresh(job)
+    assert (job.status, job.owner, job.imported) == (jobs.DONE, jobs.WORKER_ID, 3)